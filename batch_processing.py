@@ -0,0 +1,56 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from video_processing import process_video
+from utils import create_output_folder
+
+VIDEO_EXTENSIONS = (".mp4", ".avi", ".mov", ".mkv")
+
+
+def collect_videos(video_sources):
+    # Accepts a single path or a list of paths, directories are expanded to the videos they contain
+    if isinstance(video_sources, str):
+        video_sources = [video_sources]
+    video_paths = []
+    for source in video_sources:
+        if os.path.isdir(source):
+            video_paths.extend(
+                os.path.join(source, file_name)
+                for file_name in sorted(os.listdir(source))
+                if file_name.lower().endswith(VIDEO_EXTENSIONS)
+            )
+        else:
+            video_paths.append(source)
+    return video_paths
+
+
+def process_video_batch(video_sources, destination_folder, sensitivity, workers=2, progress_callback=None, **video_options):
+    video_paths = collect_videos(video_sources)
+    print(f"Batch processing {len(video_paths)} videos with {workers} workers")
+
+    # Parallelism comes from running several videos at once, each video is processed by one worker
+    video_options["workers"] = 1
+    results = [None] * len(video_paths)
+    failed = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {}
+        for index, video_path in enumerate(video_paths):
+            output_folder = create_output_folder(video_path, destination_folder)
+            future = executor.submit(process_video, video_path, output_folder, sensitivity, **video_options)
+            futures[future] = index
+
+        for completed, future in enumerate(as_completed(futures), start=1):
+            index = futures[future]
+            video_path = video_paths[index]
+            try:
+                results[index] = (video_path, future.result())
+                print(f"[{completed}/{len(futures)}] Finished {video_path}")
+            except Exception as e:
+                # One broken file must not stop the rest of the batch
+                results[index] = (video_path, None)
+                failed += 1
+                print(f"[{completed}/{len(futures)}] Failed {video_path}: {str(e)}")
+            if progress_callback:
+                progress_callback(completed, len(futures))
+
+    print(f"Batch processing completed: {len(results) - failed} succeeded, {failed} failed")
+    return results
@@ -0,0 +1,120 @@
+import os
+import glob
+import json
+from image_preprocessing import UploadStats
+from utils import encode_image, build_independent_messages, build_sequence_messages, generate_sequences
+from manifest import image_entries
+
+# Limits of a single Batch API input file, larger exports are split into several files
+BATCH_MAX_REQUESTS = 50000
+BATCH_MAX_BYTES = 190 * 1024 * 1024
+BATCH_REQUESTS_PREFIX = "batch_requests"
+
+
+def batch_request_items(screenshots_folder, prompt, image_treatment_mode, sequence_length, overlap, detail_mode, sequence_request="Multiple Images", upload_stats=None):
+    # Yields (custom_id, messages) with the same messages the synchronous modes send. The custom_id
+    # is what ends up in the Image column: the image file, or the files of a sequence.
+    images = image_entries(screenshots_folder)
+    image_files = list(images)
+    if image_treatment_mode == "Independent":
+        for image_file in image_files:
+            image_url = encode_image(os.path.join(screenshots_folder, image_file), detail_mode, upload_stats)
+            yield image_file, build_independent_messages(image_url, prompt, detail_mode)
+    else:
+        for sequence in generate_sequences(image_files, sequence_length, overlap):
+            sequence_paths = [os.path.join(screenshots_folder, image_file) for image_file in sequence]
+            yield ",".join(sequence), build_sequence_messages(sequence_paths, prompt, detail_mode, sequence_request, upload_stats, [images[image_file] for image_file in sequence])
+
+
+def export_batch_requests(screenshots_folder, prompt, image_treatment_mode, sequence_length, overlap, detail_mode, output_folder=None, sequence_request="Multiple Images"):
+    # Writes Batch API input files (one request per line) and returns their paths. Nothing is sent,
+    # the files are uploaded to the batch endpoint by hand or with other tools.
+    model = os.getenv("OPENAI_MODEL")
+    max_tokens = int(os.getenv("OPENAI_MAX_TOKENS", 100))
+    output_folder = output_folder or screenshots_folder
+    for old_path in glob.glob(os.path.join(output_folder, f"{BATCH_REQUESTS_PREFIX}*.jsonl")):
+        os.remove(old_path)
+
+    paths = []
+    batch_file = None
+    upload_stats = UploadStats()
+    try:
+        items = batch_request_items(screenshots_folder, prompt, image_treatment_mode, sequence_length, overlap, detail_mode, sequence_request, upload_stats)
+        for custom_id, messages in items:
+            line = json.dumps({
+                "custom_id": custom_id,
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": {"model": model, "messages": messages, "max_tokens": max_tokens},
+            }) + "\n"
+            line_bytes = len(line.encode("utf-8"))
+            if batch_file is None or requests_in_file >= BATCH_MAX_REQUESTS or bytes_in_file + line_bytes > BATCH_MAX_BYTES:
+                if batch_file is not None:
+                    batch_file.close()
+                suffix = f"_{len(paths) + 1}" if paths else ""
+                paths.append(os.path.join(output_folder, f"{BATCH_REQUESTS_PREFIX}{suffix}.jsonl"))
+                batch_file = open(paths[-1], "w", encoding="utf-8")
+                requests_in_file = 0
+                bytes_in_file = 0
+            batch_file.write(line)
+            requests_in_file += 1
+            bytes_in_file += line_bytes
+    finally:
+        if batch_file is not None:
+            batch_file.close()
+
+    upload_stats.report()
+    print(f"Exported batch requests to {len(paths)} files: {', '.join(paths)}")
+    return paths
+
+
+def read_request_ids(requests_paths):
+    custom_ids = []
+    for path in requests_paths:
+        with open(path, "r", encoding="utf-8") as requests_file:
+            for line in requests_file:
+                if line.strip():
+                    custom_ids.append(json.loads(line)["custom_id"])
+    return custom_ids
+
+
+def result_row(result):
+    custom_id = result["custom_id"]
+    response = result.get("response") or {}
+    if result.get("error") or response.get("status_code") != 200:
+        error = result.get("error") or response.get("body", {}).get("error") or f"status {response.get('status_code')}"
+        return {"Image": custom_id, "Description": "", "Error": json.dumps(error) if not isinstance(error, str) else error}
+    description = response["body"]["choices"][0]["message"]["content"].strip()
+    return {"Image": custom_id, "Description": description}
+
+
+def import_batch_results(results_paths, requests_paths=None):
+    # Turns downloaded Batch API output files into the same rows the synchronous modes return.
+    # Batch output is unordered; with the request files the rows follow the request order and
+    # requests without a result are reported as failed rows.
+    rows = {}
+    for path in results_paths:
+        with open(path, "r", encoding="utf-8") as results_file:
+            for line in results_file:
+                if line.strip():
+                    row = result_row(json.loads(line))
+                    rows[row["Image"]] = row
+    print(f"Imported {len(rows)} batch results")
+
+    if not requests_paths:
+        return sorted(rows.values(), key=lambda row: row["Image"])
+    descriptions = []
+    for custom_id in read_request_ids(requests_paths):
+        descriptions.append(rows.pop(custom_id, None) or {"Image": custom_id, "Description": "", "Error": "No result in the batch output"})
+    if rows:
+        print(f"Ignoring {len(rows)} results that do not belong to these requests")
+    missing = sum(1 for row in descriptions if row.get("Error"))
+    if missing:
+        print(f"{missing} of {len(descriptions)} requests failed or have no result")
+    return descriptions
+
+
+def find_batch_requests(screenshots_folder):
+    # batch_requests.jsonl, batch_requests_2.jsonl, ... in export order
+    paths = glob.glob(os.path.join(screenshots_folder, f"{BATCH_REQUESTS_PREFIX}*.jsonl"))
+    return sorted(paths, key=lambda path: (len(path), path))
@@ -0,0 +1,51 @@
+import numpy as np
+import cv2
+from PIL import Image
+
+HASH_SIZE = 8
+
+# Number of set bits for every byte value, used to popcount packed hashes
+POPCOUNT = np.array([bin(value).count("1") for value in range(256)], dtype=np.uint8)
+
+
+def load_grayscale(image_path, size):
+    with Image.open(image_path) as img:
+        img.draft("L", (size[0] * 4, size[1] * 4))  # Lets the JPEG decoder skip most of the work
+        return np.asarray(img.convert("L").resize(size, Image.BILINEAR), dtype=np.float32)
+
+
+def compute_hashes(image_paths, method="dhash"):
+    # Returns one packed 64-bit hash per image as an (N, 8) uint8 array
+    if method == "dhash":
+        pixels = np.stack([load_grayscale(path, (HASH_SIZE + 1, HASH_SIZE)) for path in image_paths])
+        bits = pixels[:, :, 1:] > pixels[:, :, :-1]
+    elif method == "phash":
+        pixels = np.stack([load_grayscale(path, (HASH_SIZE * 4, HASH_SIZE * 4)) for path in image_paths])
+        low_frequencies = np.stack([cv2.dct(image)[:HASH_SIZE, :HASH_SIZE] for image in pixels])
+        medians = np.median(low_frequencies.reshape(len(image_paths), -1)[:, 1:], axis=1)
+        bits = low_frequencies > medians[:, np.newaxis, np.newaxis]
+    else:
+        raise ValueError(f"Unknown hash method: {method}")
+    return np.packbits(bits.reshape(len(image_paths), -1), axis=1)
+
+
+def hamming_distances(hashes, reference):
+    return POPCOUNT[np.bitwise_xor(hashes, reference)].sum(axis=1, dtype=np.int32)
+
+
+def group_near_duplicates(image_paths, radius, method="dhash"):
+    # Greedy grouping in file order: the first image not in a group yet becomes a representative and
+    # takes every later ungrouped image within `radius` bits of it. Anchoring groups to their
+    # representative keeps slowly changing shots from chaining into one huge group.
+    # Returns the representative index for every image.
+    if not image_paths:
+        return []
+    hashes = compute_hashes(image_paths, method)
+    representatives = np.full(len(image_paths), -1, dtype=np.int64)
+    for i in range(len(image_paths)):
+        if representatives[i] != -1:
+            continue
+        ungrouped = np.flatnonzero(representatives[i:] == -1) + i
+        close = ungrouped[hamming_distances(hashes[ungrouped], hashes[i]) <= radius]
+        representatives[close] = i
+    return representatives.tolist()
@@ -0,0 +1,115 @@
+import bisect
+import cv2
+import numpy as np
+from scenedetect import ContentDetector
+
+FRAME_SELECTION_STRATEGIES = ["first", "sharpest", "steadiest", "middle"]
+# Strategies that score every decoded frame, the others follow from the scene list alone
+SCORED_STRATEGIES = ["sharpest", "steadiest"]
+
+
+def to_gray(frame):
+    return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+
+
+def sharpness(gray):
+    # Variance of the Laplacian: low for motion-blurred or out of focus frames
+    return cv2.Laplacian(gray, cv2.CV_64F).var()
+
+
+def middle_frame(start_frame, end_frame):
+    # Offset len // 2 into the scene, end_frame is the first frame of the next scene
+    return start_frame + (end_frame - start_frame) // 2
+
+
+class SceneFrameSelector:
+    # Picks one representative frame per scene while frames stream past, without a second decode.
+    # Frames are scored on the small detection frame, the full resolution frame of the current best
+    # candidate is kept until its scene is known to be finished.
+    #
+    # A cut can be reported up to `settle_delay` frames after it happened, so frames are only
+    # assigned to a scene once they are that far behind the newest frame.
+    def __init__(self, strategy, settle_delay, on_selected):
+        if strategy not in SCORED_STRATEGIES:
+            raise ValueError(f"Unknown frame selection strategy: {strategy}")
+        self.strategy = strategy
+        self.settle_delay = settle_delay
+        self.on_selected = on_selected
+        self.cuts = []
+        self._pending = []
+        self._previous_gray = None
+        self._scene_start = None
+        self._scene_frames = 0
+        self._best = None
+        self._last_settled = None
+
+    def add_frame(self, frame_num, detection_frame, full_frame, cuts):
+        for cut in cuts:
+            if self._last_settled is not None and cut <= self._last_settled:
+                # Reported later than settle_delay allows for: the frames already given to the
+                # previous scene stay there, the new scene starts with the first unsettled frame
+                print(f"Cut at frame {cut} reported after frame {self._last_settled} was settled, frame selection starts the scene at frame {self._last_settled + 1}")
+                cut = self._last_settled + 1
+            self.cuts.append(cut)
+        gray = to_gray(detection_frame)
+        if self.strategy == "sharpest":
+            score = sharpness(gray)
+        elif self.strategy == "steadiest":
+            # Lowest motion: smallest mean difference to the previous frame
+            if self._previous_gray is None or self._previous_gray.shape != gray.shape:
+                score = -np.inf
+            else:
+                score = -cv2.absdiff(gray, self._previous_gray).mean()
+            self._previous_gray = gray
+        self._pending.append((frame_num, score, full_frame))
+        while self._pending and self._pending[0][0] < frame_num - self.settle_delay:
+            self._settle(*self._pending.pop(0))
+
+    def finish(self):
+        while self._pending:
+            self._settle(*self._pending.pop(0))
+        # No cuts means no scenes, same as SceneManager.get_scene_list()
+        if self.cuts:
+            self._finish_scene()
+
+    def _settle(self, frame_num, score, full_frame):
+        # The scene of a frame starts at the last cut at or before it (or at the first frame)
+        self._last_settled = frame_num
+        position = bisect.bisect_right(self.cuts, frame_num)
+        scene_start = self.cuts[position - 1] if position else None
+        if self._scene_frames and scene_start != self._scene_start:
+            self._finish_scene()
+        if not self._scene_frames:
+            self._scene_start = scene_start
+        self._scene_frames += 1
+        if self._best is None or score > self._best[0]:
+            self._best = (score, frame_num, full_frame)
+
+    def _finish_scene(self):
+        _, frame_num, full_frame = self._best
+        self.on_selected(frame_num, full_frame)
+        self._scene_frames = 0
+        self._best = None
+
+
+def timecode_to_frame(timecode):
+    return timecode if isinstance(timecode, int) else timecode.get_frames()
+
+
+class SelectingContentDetector(ContentDetector):
+    # ContentDetector which also feeds every processed frame to a SceneFrameSelector. process_frame
+    # runs on the SceneManager's main loop in frame order, which is what the selector relies on.
+    # Full resolution frames come from the FullResolutionTap the video is read through.
+    def __init__(self, selector, tap, **kwargs):
+        super().__init__(**kwargs)
+        self.selector = selector
+        self.tap = tap
+
+    def process_frame(self, timecode, frame_img):
+        cuts = super().process_frame(timecode, frame_img)
+        frame_num = timecode_to_frame(timecode)
+        full_frame = self.tap.get_frame(frame_num)
+        if full_frame is None:
+            full_frame = frame_img
+        self.selector.add_frame(frame_num, frame_img, full_frame, [timecode_to_frame(cut) for cut in cuts])
+        return cuts
@@ -1,37 +1,234 @@
 import os
 import configparser
-from PyQt5.QtWidgets import QApplication, QMainWindow, QFileDialog, QPushButton, QVBoxLayout, QWidget, QProgressBar, QMessageBox, QLabel, QSpinBox, QHBoxLayout, QListWidget, QLineEdit, QTextEdit, QComboBox, QRadioButton
-import pandas as pd
-from datetime import datetime
+from PyQt5.QtWidgets import QApplication, QMainWindow, QFileDialog, QPushButton, QVBoxLayout, QWidget, QProgressBar, QMessageBox, QLabel, QSpinBox, QHBoxLayout, QListWidget, QLineEdit, QTextEdit, QComboBox, QRadioButton, QCheckBox
+import threading
 from independent_mode import process_screenshots_independent
 from sequential_mode import process_screenshots_sequential
 
 # Video processing thread
-from PyQt5.QtCore import QThread, pyqtSignal
+from PyQt5.QtCore import QThread, pyqtSignal, Qt
 from video_processing import process_video
+from batch_processing import process_video_batch
+from frame_selection import FRAME_SELECTION_STRATEGIES
+from sensitivity_sweep import sweep_sensitivity, extract_keyframes_for_sensitivity
 from screenshot_processing import process_screenshots
-from utils import calculate_token_cost
+from streaming_mode import process_stream
+from pipeline import run_pipeline
+from run_journal import read_journal_settings
+from scene_index import export_timed_descriptions
+from result_writers import ResultWriters, INDEPENDENT_COLUMNS, SEQUENTIAL_COLUMNS, save_descriptions, read_result_rows
+from batch_requests import export_batch_requests, import_batch_results, find_batch_requests
+from utils import calculate_token_cost, calculate_progress, create_output_folder
+
+
+def task_error(error, saved_paths=None):
+    # Message for a background task that stopped with an error. Descriptions are written while a
+    # run goes, so the rows finished before the error are already saved.
+    print(f"Error: {str(error)}")
+    message = str(error)
+    if saved_paths:
+        message += f"\n\nDescriptions finished before the error are saved in {', '.join(saved_paths)}"
+    return message
+
+
+def export_saved_descriptions(folder, writers):
+    # Keyframe folders of processed videos also get subtitles and chapters, made from the rows the
+    # run saved once it is over so no thread keeps every row in memory
+    return writers.paths + export_timed_descriptions(folder, read_result_rows(writers.paths))
 
 
 class VideoProcessingThread(QThread):
     processing_finished = pyqtSignal(str)
+    failed = pyqtSignal(str)
+
+    def __init__(self, video_path, output_folder, sensitivity, single_pass=False, downscale=0, frame_skip=0, workers=1, use_cache=False, frame_selection="first"):
+        super().__init__()
+        self.video_path = video_path
+        self.output_folder = output_folder
+        self.sensitivity = sensitivity
+        self.single_pass = single_pass
+        self.downscale = downscale
+        self.frame_skip = frame_skip
+        self.workers = workers
+        self.use_cache = use_cache
+        self.frame_selection = frame_selection
+
+    def run(self):
+        try:
+            output_folder = process_video(self.video_path, self.output_folder, self.sensitivity, single_pass=self.single_pass, downscale=self.downscale, frame_skip=self.frame_skip, workers=self.workers, use_cache=self.use_cache, frame_selection=self.frame_selection)
+        except Exception as e:
+            self.failed.emit(task_error(e))
+            return
+        self.processing_finished.emit(output_folder)
+
+
+class BatchVideoProcessingThread(QThread):
+    batch_finished = pyqtSignal(list)
+    progress_updated = pyqtSignal(int)
+    failed = pyqtSignal(str)
+
+    def __init__(self, video_paths, destination_folder, sensitivity, workers, **video_options):
+        super().__init__()
+        self.video_paths = video_paths
+        self.destination_folder = destination_folder
+        self.sensitivity = sensitivity
+        self.workers = workers
+        self.video_options = video_options
+
+    def run(self):
+        def progress_callback(current, total):
+            self.progress_updated.emit(int(calculate_progress(current, total)))
+
+        try:
+            results = process_video_batch(self.video_paths, self.destination_folder, self.sensitivity, self.workers, progress_callback, **self.video_options)
+        except Exception as e:
+            self.failed.emit(task_error(e))
+            return
+        self.batch_finished.emit(results)
+
+
+class SensitivitySweepThread(QThread):
+    sweep_finished = pyqtSignal(dict)
+    failed = pyqtSignal(str)
+
+    def __init__(self, video_path, thresholds, downscale=0):
+        super().__init__()
+        self.video_path = video_path
+        self.thresholds = thresholds
+        self.downscale = downscale
+
+    def run(self):
+        try:
+            scene_counts = sweep_sensitivity(self.video_path, self.thresholds, self.downscale)
+        except Exception as e:
+            self.failed.emit(task_error(e))
+            return
+        self.sweep_finished.emit(scene_counts)
+
+
+class SweepExtractionThread(QThread):
+    processing_finished = pyqtSignal(str)
+    failed = pyqtSignal(str)
 
-    def __init__(self, video_path, output_folder, sensitivity):
+    def __init__(self, video_path, output_folder, sensitivity, downscale=0):
         super().__init__()
         self.video_path = video_path
         self.output_folder = output_folder
         self.sensitivity = sensitivity
+        self.downscale = downscale
 
     def run(self):
-        output_folder = process_video(self.video_path, self.output_folder, self.sensitivity)
+        try:
+            output_folder = extract_keyframes_for_sensitivity(self.video_path, self.output_folder, self.sensitivity, self.downscale)
+        except Exception as e:
+            self.failed.emit(task_error(e))
+            return
         self.processing_finished.emit(output_folder)
 
 
+class LiveStreamThread(QThread):
+    description_ready = pyqtSignal(dict)
+    stream_finished = pyqtSignal(str, int, int, list)
+    failed = pyqtSignal(str)
+
+    def __init__(self, source, output_folder, sensitivity, prompt, detail_mode, downscale=0):
+        super().__init__()
+        self.source = source
+        self.output_folder = output_folder
+        self.sensitivity = sensitivity
+        self.prompt = prompt
+        self.detail_mode = detail_mode
+        self.downscale = downscale
+        self.stop_event = threading.Event()
+
+    def run(self):
+        # Every description is saved as soon as it arrives
+        try:
+            writers = ResultWriters(self.output_folder, INDEPENDENT_COLUMNS)
+        except Exception as e:
+            self.failed.emit(task_error(e))
+            return
+
+        def description_ready(row):
+            writers.write(row)
+            self.description_ready.emit(row)
+
+        try:
+            with writers:
+                process_stream(self.source, self.output_folder, self.sensitivity, self.prompt, self.detail_mode, description_ready, self.downscale, self.stop_event)
+            result_paths = export_saved_descriptions(self.output_folder, writers)
+        except Exception as e:
+            self.failed.emit(task_error(e, writers.paths))
+            return
+        self.stream_finished.emit(self.output_folder, writers.rows, writers.failed, result_paths)
+
+
+class PipelineThread(QThread):
+    description_ready = pyqtSignal(dict)
+    pipeline_finished = pyqtSignal(str, int, int, list)
+    failed = pyqtSignal(str)
+
+    def __init__(self, video_path, output_folder, sensitivity, prompt, detail_mode, **video_options):
+        super().__init__()
+        self.video_path = video_path
+        self.output_folder = output_folder
+        self.sensitivity = sensitivity
+        self.prompt = prompt
+        self.detail_mode = detail_mode
+        self.video_options = video_options
+
+    def run(self):
+        # Rows are saved in frame order while the descriptions finish
+        try:
+            writers = ResultWriters(self.output_folder, INDEPENDENT_COLUMNS)
+        except Exception as e:
+            self.failed.emit(task_error(e))
+            return
+
+        def description_ready(row):
+            writers.write(row)
+            self.description_ready.emit(row)
+
+        try:
+            with writers:
+                run_pipeline(self.video_path, self.output_folder, self.sensitivity, self.prompt, self.detail_mode, description_ready, **self.video_options)
+            result_paths = export_saved_descriptions(self.output_folder, writers)
+        except Exception as e:
+            self.failed.emit(task_error(e, writers.paths))
+            return
+        self.pipeline_finished.emit(self.output_folder, writers.rows, writers.failed, result_paths)
+
+
+class BatchExportThread(QThread):
+    export_finished = pyqtSignal(list)
+    failed = pyqtSignal(str)
+
+    def __init__(self, screenshots_folder, prompt, image_treatment_mode, sequence_length, overlap, detail_mode, sequence_request="Multiple Images"):
+        super().__init__()
+        self.screenshots_folder = screenshots_folder
+        self.prompt = prompt
+        self.image_treatment_mode = image_treatment_mode
+        self.sequence_length = sequence_length
+        self.overlap = overlap
+        self.detail_mode = detail_mode
+        self.sequence_request = sequence_request
+
+    def run(self):
+        try:
+            paths = export_batch_requests(self.screenshots_folder, self.prompt, self.image_treatment_mode, self.sequence_length, self.overlap, self.detail_mode, sequence_request=self.sequence_request)
+        except Exception as e:
+            self.failed.emit(task_error(e))
+            return
+        self.export_finished.emit(paths)
+
+
 class ScreenshotProcessingThread(QThread):
-    processing_finished = pyqtSignal(list)
+    description_ready = pyqtSignal(dict)
+    processing_finished = pyqtSignal(int, int, list)
     progress_updated = pyqtSignal(int)
+    failed = pyqtSignal(str)
 
-    def __init__(self, screenshots_folder, prompt, image_treatment_mode, sequence_length, overlap, detail_mode):
+    def __init__(self, screenshots_folder, prompt, image_treatment_mode, sequence_length, overlap, detail_mode, dedup_radius=None, resume=False, sequence_request="Multiple Images"):
         super().__init__()
         self.screenshots_folder = screenshots_folder
         self.prompt = prompt
@@ -39,18 +236,39 @@ class ScreenshotProcessingThread(QThread):
         self.sequence_length = sequence_length
         self.overlap = overlap
         self.detail_mode = detail_mode
+        self.dedup_radius = dedup_radius
+        self.resume = resume
+        self.sequence_request = sequence_request
 
     def run(self):
         def progress_callback(current, total):
             progress = int((current / total) * 100)
             self.progress_updated.emit(progress)
 
-        if self.image_treatment_mode == "Independent":
-            descriptions = process_screenshots_independent(self.screenshots_folder, self.prompt, self.detail_mode, progress_callback)
-        else:
-            descriptions = process_screenshots_sequential(self.screenshots_folder, self.prompt, self.sequence_length, self.overlap, self.detail_mode, progress_callback)
+        # Every row is appended to the result files and shown as soon as it is final
+        independent = self.image_treatment_mode == "Independent"
+        try:
+            writers = ResultWriters(self.screenshots_folder, INDEPENDENT_COLUMNS if independent else SEQUENTIAL_COLUMNS)
+        except Exception as e:
+            self.failed.emit(task_error(e))
+            return
 
-        self.processing_finished.emit(descriptions)
+        def row_ready(row):
+            writers.write(row)
+            self.description_ready.emit(row)
+
+        try:
+            with writers:
+                if independent:
+                    process_screenshots_independent(self.screenshots_folder, self.prompt, self.detail_mode, progress_callback, self.dedup_radius, resume=self.resume, row_callback=row_ready)
+                else:
+                    process_screenshots_sequential(self.screenshots_folder, self.prompt, self.sequence_length, self.overlap, self.detail_mode, progress_callback, resume=self.resume, sequence_request=self.sequence_request, row_callback=row_ready)
+            result_paths = export_saved_descriptions(self.screenshots_folder, writers)
+        except Exception as e:
+            self.failed.emit(task_error(e, writers.paths))
+            return
+
+        self.processing_finished.emit(writers.rows, writers.failed, result_paths)
 
 
 class MainWindow(QMainWindow):
@@ -90,6 +308,15 @@ class MainWindow(QMainWindow):
         self.scene_detection_destination_folder = None
         self.screenshots_source_folder = None
         self.sensitivity = 30
+        self.single_pass = False
+        self.downscale = 0
+        self.frame_skip = 0
+        self.workers = 1
+        self.use_cache = False
+        self.frame_selection = "first"
+        self.stream_source = ""
+        self.dedup_radius = 0
+        self.sequence_request = "Multiple Images"
 
         self.save_prompt_button = QPushButton("Save Prompt")
         self.save_prompt_button.clicked.connect(self.save_prompt)
@@ -125,14 +352,102 @@ class MainWindow(QMainWindow):
         sensitivity_layout.addWidget(self.sensitivity_label)
         sensitivity_layout.addWidget(self.sensitivity_spinbox)
 
+        self.single_pass_checkbox = QCheckBox("Single-pass keyframe capture")
+        self.single_pass_checkbox.stateChanged.connect(self.update_single_pass)
+
+        self.use_cache_checkbox = QCheckBox("Use scene detection cache")
+        self.use_cache_checkbox.stateChanged.connect(self.update_use_cache)
+
+        self.downscale_label = QLabel("Detection Downscale:")
+        self.downscale_spinbox = QSpinBox()
+        self.downscale_spinbox.setMinimum(0)
+        self.downscale_spinbox.setMaximum(16)
+        self.downscale_spinbox.setSpecialValueText("Auto")
+        self.downscale_spinbox.valueChanged.connect(self.update_downscale)
+
+        self.frame_skip_label = QLabel("Detection Frame Skip:")
+        self.frame_skip_spinbox = QSpinBox()
+        self.frame_skip_spinbox.setMinimum(0)
+        self.frame_skip_spinbox.setMaximum(30)
+        self.frame_skip_spinbox.valueChanged.connect(self.update_frame_skip)
+
+        self.workers_label = QLabel("Detection Workers:")
+        self.workers_spinbox = QSpinBox()
+        self.workers_spinbox.setMinimum(1)
+        self.workers_spinbox.setMaximum(os.cpu_count() or 1)
+        self.workers_spinbox.valueChanged.connect(self.update_workers)
+
+        self.frame_selection_label = QLabel("Keyframe Selection:")
+        self.frame_selection_combo = QComboBox()
+        self.frame_selection_combo.addItems(FRAME_SELECTION_STRATEGIES)
+        self.frame_selection_combo.currentTextChanged.connect(self.update_frame_selection)
+
+        detection_layout = QHBoxLayout()
+        detection_layout.addWidget(self.downscale_label)
+        detection_layout.addWidget(self.downscale_spinbox)
+        detection_layout.addWidget(self.frame_skip_label)
+        detection_layout.addWidget(self.frame_skip_spinbox)
+        detection_layout.addWidget(self.workers_label)
+        detection_layout.addWidget(self.workers_spinbox)
+        detection_layout.addWidget(self.frame_selection_label)
+        detection_layout.addWidget(self.frame_selection_combo)
+
         self.run_video_button = QPushButton("Run Video Processing")
         self.run_video_button.clicked.connect(self.run_video_processing)
         self.run_video_button.setEnabled(False)
 
+        self.run_pipeline_button = QPushButton("Run Full Pipeline")
+        self.run_pipeline_button.clicked.connect(self.run_full_pipeline)
+        self.run_pipeline_button.setEnabled(False)
+
+        self.run_batch_button = QPushButton("Run Batch Video Processing")
+        self.run_batch_button.clicked.connect(self.run_batch_video_processing)
+
+        self.sweep_button = QPushButton("Sweep Sensitivity")
+        self.sweep_button.clicked.connect(self.run_sensitivity_sweep)
+        self.sweep_button.setEnabled(False)
+
+        self.extract_from_sweep_button = QPushButton("Extract Keyframes From Sweep")
+        self.extract_from_sweep_button.clicked.connect(self.run_sweep_extraction)
+        self.extract_from_sweep_button.setEnabled(False)
+
+        self.stream_source_label = QLabel("Live Source (device number, URL or recording file):")
+        self.stream_source_edit = QLineEdit()
+        self.stream_source_edit.textChanged.connect(self.update_stream_source)
+
+        self.start_stream_button = QPushButton("Start Live Description")
+        self.start_stream_button.clicked.connect(self.start_live_stream)
+
+        self.stop_stream_button = QPushButton("Stop Live Description")
+        self.stop_stream_button.clicked.connect(self.stop_live_stream)
+        self.stop_stream_button.setEnabled(False)
+
+        stream_layout = QHBoxLayout()
+        stream_layout.addWidget(self.stream_source_edit)
+        stream_layout.addWidget(self.start_stream_button)
+        stream_layout.addWidget(self.stop_stream_button)
+
+        sweep_layout = QHBoxLayout()
+        sweep_layout.addWidget(self.sweep_button)
+        sweep_layout.addWidget(self.extract_from_sweep_button)
+
         self.run_screenshots_button = QPushButton("Run Screenshot Processing")
         self.run_screenshots_button.clicked.connect(self.run_screenshot_processing)
         self.run_screenshots_button.setEnabled(False)
 
+        self.resume_screenshots_button = QPushButton("Resume Screenshot Processing")
+        self.resume_screenshots_button.clicked.connect(self.resume_screenshot_processing)
+
+        self.export_batch_button = QPushButton("Export Batch Requests")
+        self.export_batch_button.clicked.connect(self.export_batch)
+
+        self.import_batch_button = QPushButton("Import Batch Results")
+        self.import_batch_button.clicked.connect(self.import_batch)
+
+        batch_api_layout = QHBoxLayout()
+        batch_api_layout.addWidget(self.export_batch_button)
+        batch_api_layout.addWidget(self.import_batch_button)
+
         self.progress_bar = QProgressBar()
         self.progress_bar.setVisible(True)
 
@@ -165,11 +480,23 @@ class MainWindow(QMainWindow):
         self.overlap_spinbox.setValue(2)
         self.overlap_spinbox.valueChanged.connect(self.update_overlap)
 
+        self.sequence_request_label = QLabel("Sequence Request:")
+        self.sequence_request_combo = QComboBox()
+        self.sequence_request_combo.addItems(["Multiple Images", "Mosaic"])
+        self.sequence_request_combo.currentTextChanged.connect(self.update_sequence_request)
+
         self.detail_mode_label = QLabel("Detail Mode:")
         self.detail_mode_combo = QComboBox()
         self.detail_mode_combo.addItems(["Low", "High", "Auto"])
         self.detail_mode_combo.currentTextChanged.connect(self.update_detail_mode)
 
+        self.dedup_radius_label = QLabel("Near-Duplicate Radius (Independent mode):")
+        self.dedup_radius_spinbox = QSpinBox()
+        self.dedup_radius_spinbox.setMinimum(0)
+        self.dedup_radius_spinbox.setMaximum(32)
+        self.dedup_radius_spinbox.setSpecialValueText("Off")
+        self.dedup_radius_spinbox.valueChanged.connect(self.update_dedup_radius)
+
         self.cost_label = QLabel("Estimated Token Cost: 0")
 
         self.load_prompts()
@@ -180,7 +507,15 @@ class MainWindow(QMainWindow):
         layout.addWidget(self.select_scene_detection_destination_button)
         layout.addWidget(self.scene_detection_destination_label)
         layout.addLayout(sensitivity_layout)
+        layout.addWidget(self.single_pass_checkbox)
+        layout.addWidget(self.use_cache_checkbox)
+        layout.addLayout(detection_layout)
         layout.addWidget(self.run_video_button)
+        layout.addWidget(self.run_pipeline_button)
+        layout.addWidget(self.run_batch_button)
+        layout.addLayout(sweep_layout)
+        layout.addWidget(self.stream_source_label)
+        layout.addLayout(stream_layout)
 
         layout.addWidget(self.select_screenshots_source_button)
         layout.addWidget(self.screenshots_source_label)
@@ -190,14 +525,20 @@ class MainWindow(QMainWindow):
         layout.addWidget(self.sequence_length_spinbox)
         layout.addWidget(self.overlap_label)
         layout.addWidget(self.overlap_spinbox)
+        layout.addWidget(self.sequence_request_label)
+        layout.addWidget(self.sequence_request_combo)
         layout.addWidget(self.detail_mode_label)
         layout.addWidget(self.detail_mode_combo)
+        layout.addWidget(self.dedup_radius_label)
+        layout.addWidget(self.dedup_radius_spinbox)
         layout.addWidget(self.cost_label)
         layout.addWidget(self.prompts_listbox)
         layout.addWidget(self.prompt_edit)
         layout.addWidget(self.save_prompt_button)
         layout.addWidget(self.delete_prompt_button)
         layout.addWidget(self.run_screenshots_button)
+        layout.addWidget(self.resume_screenshots_button)
+        layout.addLayout(batch_api_layout)
         layout.addWidget(self.progress_bar)
         layout.addWidget(self.descriptions_text_edit)
 
@@ -216,20 +557,40 @@ class MainWindow(QMainWindow):
             self.scene_detection_destination_folder = config.get("LastState", "SceneDetectionDestinationFolder", fallback=None)
             self.screenshots_source_folder = config.get("LastState", "ScreenshotsSourceFolder", fallback=None)
             self.sensitivity = config.getint("LastState", "Sensitivity", fallback=30)
+            self.single_pass = config.getboolean("LastState", "SinglePass", fallback=False)
+            self.downscale = config.getint("LastState", "Downscale", fallback=0)
+            self.frame_skip = config.getint("LastState", "FrameSkip", fallback=0)
+            self.workers = config.getint("LastState", "Workers", fallback=1)
+            self.use_cache = config.getboolean("LastState", "UseCache", fallback=False)
+            self.frame_selection = config.get("LastState", "FrameSelection", fallback="first")
+            self.stream_source = config.get("LastState", "StreamSource", fallback="")
             self.image_treatment_mode = config.get("LastState", "ImageTreatmentMode", fallback="Independent")
             self.sequence_length = config.getint("LastState", "SequenceLength", fallback=5)
             self.overlap = config.getint("LastState", "Overlap", fallback=2)
+            self.sequence_request = config.get("LastState", "SequenceRequest", fallback="Multiple Images")
             self.detail_mode = config.get("LastState", "DetailMode", fallback="Auto")
+            self.dedup_radius = config.getint("LastState", "DedupRadius", fallback=0)
 
             if self.video_path:
                 self.video_label.setText(f"Selected video: {self.video_path}")
                 self.run_video_button.setEnabled(True)
+                self.run_pipeline_button.setEnabled(True)
+                self.sweep_button.setEnabled(True)
             if self.scene_detection_destination_folder:
                 self.scene_detection_destination_label.setText(f"Selected scene detection destination folder: {self.scene_detection_destination_folder}")
             if self.screenshots_source_folder:
                 self.screenshots_source_label.setText(f"Selected screenshots source folder: {self.screenshots_source_folder}")
                 self.run_screenshots_button.setEnabled(True)
             self.sensitivity_spinbox.setValue(self.sensitivity)
+            self.single_pass_checkbox.setChecked(self.single_pass)
+            self.downscale_spinbox.setValue(self.downscale)
+            self.frame_skip_spinbox.setValue(self.frame_skip)
+            self.workers_spinbox.setValue(self.workers)
+            self.use_cache_checkbox.setChecked(self.use_cache)
+            self.frame_selection_combo.setCurrentText(self.frame_selection)
+            self.stream_source_edit.setText(self.stream_source)
+            self.dedup_radius_spinbox.setValue(self.dedup_radius)
+            self.sequence_request_combo.setCurrentText(self.sequence_request)
         else:
             self.save_config()
 
@@ -240,10 +601,19 @@ class MainWindow(QMainWindow):
             "SceneDetectionDestinationFolder": self.scene_detection_destination_folder or "",
             "ScreenshotsSourceFolder": self.screenshots_source_folder or "",
             "Sensitivity": str(self.sensitivity),
+            "SinglePass": str(self.single_pass),
+            "Downscale": str(self.downscale),
+            "FrameSkip": str(self.frame_skip),
+            "Workers": str(self.workers),
+            "UseCache": str(self.use_cache),
+            "FrameSelection": self.frame_selection,
+            "StreamSource": self.stream_source,
             "ImageTreatmentMode": (self.image_treatment_mode),
             "SequenceLength": str(self.sequence_length),
             "Overlap": str(self.overlap),
-            "DetailMode": self.detail_mode
+            "SequenceRequest": self.sequence_request,
+            "DetailMode": self.detail_mode,
+            "DedupRadius": str(self.dedup_radius)
         }
         with open(self.config_file, "w") as f:
             config.write(f)
@@ -258,6 +628,9 @@ class MainWindow(QMainWindow):
             self.video_path = video_path
             self.video_label.setText(f"Selected video: {video_path}")
             self.run_video_button.setEnabled(True)
+            self.run_pipeline_button.setEnabled(True)
+            self.sweep_button.setEnabled(True)
+            self.extract_from_sweep_button.setEnabled(False)
             self.save_config()
             self.update_cost_estimate()  
 
@@ -281,26 +654,251 @@ class MainWindow(QMainWindow):
         self.sensitivity = value
         self.save_config()
 
+    def update_single_pass(self, state):
+        self.single_pass = state == Qt.Checked
+        self.save_config()
+
+    def update_use_cache(self, state):
+        self.use_cache = state == Qt.Checked
+        self.save_config()
+
+    def update_frame_selection(self, text):
+        self.frame_selection = text
+        self.save_config()
+
+    def update_stream_source(self, text):
+        self.stream_source = text.strip()
+        self.save_config()
+
+    def update_dedup_radius(self, value):
+        self.dedup_radius = value
+        self.save_config()
+
+    def update_downscale(self, value):
+        self.downscale = value
+        self.save_config()
+
+    def update_frame_skip(self, value):
+        self.frame_skip = value
+        self.save_config()
+
+    def update_workers(self, value):
+        self.workers = value
+        self.save_config()
+
     def run_video_processing(self):
         if self.video_path and self.scene_detection_destination_folder:
-            self.processing_thread = VideoProcessingThread(self.video_path, self.scene_detection_destination_folder, self.sensitivity)
+            self.processing_thread = VideoProcessingThread(self.video_path, self.scene_detection_destination_folder, self.sensitivity, self.single_pass, self.downscale, self.frame_skip, self.workers, self.use_cache, self.frame_selection)
             self.processing_thread.processing_finished.connect(self.video_processing_finished)
+            self.processing_thread.failed.connect(lambda error: self.task_failed("Video Processing Failed", error))
             self.processing_thread.start()
             self.progress_bar.setVisible(True)
 
+    def run_batch_video_processing(self):
+        if not self.scene_detection_destination_folder:
+            QMessageBox.warning(self, "No Destination Folder", "Please select a scene detection destination folder.")
+            return
+        video_paths, _ = QFileDialog.getOpenFileNames(self, "Select Videos", "", "Video Files (*.mp4 *.avi *.mov *.mkv)")
+        if video_paths:
+            # Each video gets its own subfolder of the destination folder, "Detection Workers" sets the pool size
+            self.batch_thread = BatchVideoProcessingThread(video_paths, self.scene_detection_destination_folder, self.sensitivity, self.workers, single_pass=self.single_pass, downscale=self.downscale, frame_skip=self.frame_skip, use_cache=self.use_cache, frame_selection=self.frame_selection)
+            self.batch_thread.progress_updated.connect(self.update_progress)
+            self.batch_thread.batch_finished.connect(self.batch_video_processing_finished)
+            self.batch_thread.failed.connect(lambda error: self.task_failed("Batch Processing Failed", error))
+            self.batch_thread.start()
+            self.progress_bar.setVisible(True)
+
+    def batch_video_processing_finished(self, results):
+        self.progress_bar.setVisible(False)
+        self.descriptions_text_edit.clear()
+        for video_path, output_folder in results:
+            self.descriptions_text_edit.append(f"{video_path}: {output_folder or 'FAILED'}")
+        failed = sum(1 for _, output_folder in results if output_folder is None)
+        QMessageBox.information(self, "Batch Complete", f"Processed {len(results)} videos, {failed} failed. Keyframes saved in {self.scene_detection_destination_folder}")
+
+    def run_sensitivity_sweep(self):
+        if self.video_path:
+            thresholds = list(range(self.sensitivity_spinbox.minimum(), self.sensitivity_spinbox.maximum() + 1))
+            self.sweep_thread = SensitivitySweepThread(self.video_path, thresholds, self.downscale)
+            self.sweep_thread.sweep_finished.connect(self.sensitivity_sweep_finished)
+            self.sweep_thread.failed.connect(lambda error: self.task_failed("Sensitivity Sweep Failed", error, self.sweep_button))
+            self.sweep_thread.start()
+            self.sweep_button.setEnabled(False)
+
+    def sensitivity_sweep_finished(self, scene_counts):
+        self.sweep_button.setEnabled(True)
+        self.extract_from_sweep_button.setEnabled(True)
+        self.descriptions_text_edit.clear()
+        self.descriptions_text_edit.append("Scenes per sensitivity:")
+        for threshold, count in scene_counts.items():
+            self.descriptions_text_edit.append(f"Sensitivity {threshold:g}: {count} scenes")
+        QMessageBox.information(self, "Sweep Complete", "Pick a sensitivity and click \"Extract Keyframes From Sweep\".")
+
+    def run_sweep_extraction(self):
+        if self.video_path and self.scene_detection_destination_folder:
+            self.processing_thread = SweepExtractionThread(self.video_path, self.scene_detection_destination_folder, self.sensitivity, self.downscale)
+            self.processing_thread.processing_finished.connect(self.video_processing_finished)
+            self.processing_thread.failed.connect(lambda error: self.task_failed("Keyframe Extraction Failed", error))
+            self.processing_thread.start()
+            self.progress_bar.setVisible(True)
+
+    def run_full_pipeline(self):
+        if not self.video_path:
+            return
+        if not self.scene_detection_destination_folder:
+            QMessageBox.warning(self, "No Destination Folder", "Please select a scene detection destination folder.")
+            return
+        current_item = self.prompts_listbox.currentItem()
+        if not current_item:
+            QMessageBox.warning(self, "No Prompt Selected", "Please select a prompt from the list.")
+            return
+        prompt = self.prompts_config.get("Prompts", current_item.text())
+        output_folder = create_output_folder(self.video_path, self.scene_detection_destination_folder)
+        self.pipeline_thread = PipelineThread(self.video_path, output_folder, self.sensitivity, prompt, self.detail_mode, single_pass=self.single_pass, downscale=self.downscale, frame_skip=self.frame_skip, workers=self.workers, use_cache=self.use_cache, frame_selection=self.frame_selection)
+        self.pipeline_thread.description_ready.connect(self.live_description_ready)
+        self.pipeline_thread.pipeline_finished.connect(self.pipeline_finished)
+        self.pipeline_thread.failed.connect(lambda error: self.task_failed("Pipeline Failed", error, self.run_pipeline_button))
+        self.descriptions_text_edit.clear()
+        self.pipeline_thread.start()
+        self.run_pipeline_button.setEnabled(False)
+
+    def pipeline_finished(self, output_folder, rows, failed, result_paths):
+        self.run_pipeline_button.setEnabled(True)
+        self.show_keyframe_descriptions(output_folder, rows, failed, result_paths)
+
+    def start_live_stream(self):
+        if not self.stream_source:
+            QMessageBox.warning(self, "No Live Source", "Please enter a device number, stream URL or recording file.")
+            return
+        if not self.scene_detection_destination_folder:
+            QMessageBox.warning(self, "No Destination Folder", "Please select a scene detection destination folder.")
+            return
+        current_item = self.prompts_listbox.currentItem()
+        if not current_item:
+            QMessageBox.warning(self, "No Prompt Selected", "Please select a prompt from the list.")
+            return
+        prompt = self.prompts_config.get("Prompts", current_item.text())
+        source_name = f"device{self.stream_source}" if self.stream_source.isdigit() else self.stream_source.rstrip("/")
+        output_folder = create_output_folder(source_name, self.scene_detection_destination_folder)
+        self.stream_thread = LiveStreamThread(self.stream_source, output_folder, self.sensitivity, prompt, self.detail_mode, self.downscale)
+        self.stream_thread.description_ready.connect(self.live_description_ready)
+        self.stream_thread.stream_finished.connect(self.live_stream_finished)
+        self.stream_thread.failed.connect(self.live_stream_failed)
+        self.descriptions_text_edit.clear()
+        self.stream_thread.start()
+        self.start_stream_button.setEnabled(False)
+        self.stop_stream_button.setEnabled(True)
+
+    def stop_live_stream(self):
+        self.stream_thread.stop_event.set()
+        self.stop_stream_button.setEnabled(False)
+
+    def live_description_ready(self, description):
+        self.descriptions_text_edit.append(f"Image: {description['Image']}")
+        if description.get("Error"):
+            self.descriptions_text_edit.append(f"FAILED: {description['Error']}")
+        else:
+            self.descriptions_text_edit.append(f"Description: {description['Description']}")
+        self.descriptions_text_edit.append("---")
+
+    def live_stream_failed(self, error):
+        self.stop_stream_button.setEnabled(False)
+        self.task_failed("Live Description Failed", error, self.start_stream_button)
+
+    def live_stream_finished(self, output_folder, rows, failed, result_paths):
+        self.start_stream_button.setEnabled(True)
+        self.stop_stream_button.setEnabled(False)
+        self.show_keyframe_descriptions(output_folder, rows, failed, result_paths)
+
+    def show_keyframe_descriptions(self, output_folder, rows, failed, result_paths):
+        # The keyframe folder becomes the screenshots folder, next to the saved descriptions
+        self.screenshots_source_folder = output_folder
+        self.screenshots_source_label.setText(f"Selected screenshots source folder: {output_folder}")
+        self.run_screenshots_button.setEnabled(True)
+        self.save_config()
+        self.screenshot_processing_finished(rows, failed, result_paths)
+
     def run_screenshot_processing(self):
         if self.screenshots_source_folder:
             current_item = self.prompts_listbox.currentItem()
             if current_item:
                 prompt = self.prompts_config.get("Prompts", current_item.text())
-                self.screenshot_processing_thread = ScreenshotProcessingThread(self.screenshots_source_folder, prompt, self.image_treatment_mode, self.sequence_length, self.overlap, self.detail_mode)
+                self.screenshot_processing_thread = ScreenshotProcessingThread(self.screenshots_source_folder, prompt, self.image_treatment_mode, self.sequence_length, self.overlap, self.detail_mode, self.dedup_radius or None, sequence_request=self.sequence_request)
+                self.screenshot_processing_thread.description_ready.connect(self.live_description_ready)
                 self.screenshot_processing_thread.processing_finished.connect(self.screenshot_processing_finished)
+                self.screenshot_processing_thread.failed.connect(lambda error: self.task_failed("Screenshot Processing Failed", error))
                 self.screenshot_processing_thread.progress_updated.connect(self.update_progress)
+                self.descriptions_text_edit.clear()
                 self.screenshot_processing_thread.start()
                 self.progress_bar.setVisible(True)
             else:
                 QMessageBox.warning(self, "No Prompt Selected", "Please select a prompt from the list.")
 
+    def resume_screenshot_processing(self):
+        # Continues the last run in the screenshots folder with the settings it was started with
+        settings = read_journal_settings(self.screenshots_source_folder) if self.screenshots_source_folder else None
+        if settings is None:
+            QMessageBox.warning(self, "Nothing To Resume", "The selected screenshots folder has no description journal.")
+            return
+        if settings["model"] != os.getenv("OPENAI_MODEL") or settings["max_tokens"] != int(os.getenv("OPENAI_MAX_TOKENS", 100)):
+            QMessageBox.warning(self, "Settings Changed", f"The run was started with model {settings['model']} and {settings['max_tokens']} max tokens, restore these settings to resume it.")
+            return
+        self.screenshot_processing_thread = ScreenshotProcessingThread(
+            self.screenshots_source_folder,
+            settings["prompt"],
+            settings["mode"],
+            settings.get("sequence_length", self.sequence_length),
+            settings.get("overlap", self.overlap),
+            settings["detail_mode"],
+            settings.get("dedup_radius"),
+            resume=True,
+            sequence_request=settings.get("sequence_request", "Multiple Images"),
+        )
+        self.screenshot_processing_thread.description_ready.connect(self.live_description_ready)
+        self.screenshot_processing_thread.processing_finished.connect(self.screenshot_processing_finished)
+        self.screenshot_processing_thread.failed.connect(lambda error: self.task_failed("Screenshot Processing Failed", error))
+        self.screenshot_processing_thread.progress_updated.connect(self.update_progress)
+        self.descriptions_text_edit.clear()
+        self.screenshot_processing_thread.start()
+        self.progress_bar.setVisible(True)
+
+    def export_batch(self):
+        # Writes Batch API request files with the current prompt and settings, nothing is sent
+        if not self.screenshots_source_folder:
+            QMessageBox.warning(self, "No Screenshots Source Folder", "Please select a screenshots source folder.")
+            return
+        current_item = self.prompts_listbox.currentItem()
+        if not current_item:
+            QMessageBox.warning(self, "No Prompt Selected", "Please select a prompt from the list.")
+            return
+        prompt = self.prompts_config.get("Prompts", current_item.text())
+        self.batch_export_thread = BatchExportThread(self.screenshots_source_folder, prompt, self.image_treatment_mode, self.sequence_length, self.overlap, self.detail_mode, self.sequence_request)
+        self.batch_export_thread.export_finished.connect(self.batch_export_finished)
+        self.batch_export_thread.failed.connect(lambda error: self.task_failed("Batch Export Failed", error, self.export_batch_button))
+        self.batch_export_thread.start()
+        self.export_batch_button.setEnabled(False)
+
+    def batch_export_finished(self, paths):
+        self.export_batch_button.setEnabled(True)
+        QMessageBox.information(self, "Batch Requests Exported", "Upload these files to the Batch API:\n" + "\n".join(paths))
+
+    def import_batch(self):
+        if not self.screenshots_source_folder:
+            QMessageBox.warning(self, "No Screenshots Source Folder", "Please select the screenshots folder the batch requests were exported from.")
+            return
+        results_paths, _ = QFileDialog.getOpenFileNames(self, "Select Batch Results", self.screenshots_source_folder, "Batch Results (*.jsonl)")
+        if results_paths:
+            # The exported request files put the rows back in request order
+            descriptions = import_batch_results(results_paths, find_batch_requests(self.screenshots_source_folder))
+            self.descriptions_text_edit.clear()
+            for description in descriptions:
+                self.live_description_ready(description)
+            result_paths = []
+            if descriptions:
+                result_paths = self.save_descriptions(descriptions) + export_timed_descriptions(self.screenshots_source_folder, descriptions)
+            failed = sum(1 for description in descriptions if description.get("Error"))
+            self.screenshot_processing_finished(len(descriptions), failed, result_paths)
+
     def update_progress(self, value):
         self.progress_bar.setValue(value)
 
@@ -329,6 +927,8 @@ class MainWindow(QMainWindow):
         self.sequence_length_spinbox.setVisible(mode == "Consequent")
         self.overlap_label.setVisible(mode == "Consequent")
         self.overlap_spinbox.setVisible(mode == "Consequent")
+        self.sequence_request_label.setVisible(mode == "Consequent")
+        self.sequence_request_combo.setVisible(mode == "Consequent")
         self.save_config()
         self.update_cost_estimate()
 
@@ -348,7 +948,7 @@ class MainWindow(QMainWindow):
         self.update_cost_estimate()
 
     def update_cost_estimate(self):
-        cost = calculate_token_cost(self.screenshots_source_folder, self.detail_mode, self.image_treatment_mode, self.sequence_length, self.overlap)
+        cost = calculate_token_cost(self.screenshots_source_folder, self.detail_mode, self.image_treatment_mode, self.sequence_length, self.overlap, self.sequence_request)
         self.cost_label.setText(f"Estimated Token Cost: {cost}")
 
     def load_prompts(self):
@@ -362,18 +962,13 @@ class MainWindow(QMainWindow):
         for prompt in self.prompts_config.options("Prompts"):
             self.prompts_listbox.addItem(prompt)
 
-    def screenshot_processing_finished(self, descriptions):
+    def screenshot_processing_finished(self, rows, failed, result_paths):
+        # The rows were shown and saved while the run went, result_paths are the files they are in
         self.progress_bar.setVisible(False)
-        self.descriptions_text_edit.clear()
 
-        if descriptions:
-            for description in descriptions:
-                self.descriptions_text_edit.append(f"Image: {description['Image']}")
-                self.descriptions_text_edit.append(f"Description: {description['Description']}")
-                self.descriptions_text_edit.append("---")
-            
-            excel_path = self.save_descriptions_to_excel(descriptions)
-            QMessageBox.information(self, "Processing Complete", f"Screenshot processing finished. Descriptions saved in {excel_path}")
+        if rows:
+            failed_note = f" {failed} images failed, see the Error column." if failed else ""
+            QMessageBox.information(self, "Processing Complete", f"Screenshot processing finished. Descriptions saved in {', '.join(result_paths)}.{failed_note}")
         else:
             QMessageBox.information(self, "Processing Aborted", "Screenshot processing aborted. No descriptions generated.")
 
@@ -411,15 +1006,17 @@ class MainWindow(QMainWindow):
         self.progress_bar.setVisible(False)
         QMessageBox.information(self, "Processing Complete", f"Video processing finished. Keyframes saved in {output_folder}")
 
-    def save_descriptions_to_excel(self, descriptions):
+    def task_failed(self, title, error, button=None):
+        # A background thread stopped with an error, give the controls back
+        self.progress_bar.setVisible(False)
+        if button is not None:
+            button.setEnabled(True)
+        QMessageBox.critical(self, title, error)
+
+    def save_descriptions(self, descriptions):
         if self.screenshots_source_folder:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            excel_filename = f"descriptions_{timestamp}.xlsx"
-            excel_path = os.path.join(self.screenshots_source_folder, excel_filename)
-            df = pd.DataFrame(descriptions)
-            df = df[["Description", "Image"]]  # Reorder the columns
-            df.to_excel(excel_path, index=False, header=["Description", "Composite Image"])
-            return excel_path
+            # Failed requests are kept as rows so they can be found and re-run
+            return save_descriptions(self.screenshots_source_folder, descriptions)
         else:
             QMessageBox.warning(self, "No Screenshots Source Folder", "Please select a screenshots source folder.")
             return None
@@ -430,6 +1027,8 @@ class MainWindow(QMainWindow):
         self.sequence_length_spinbox.setVisible(mode == "Consequent")
         self.overlap_label.setVisible(mode == "Consequent")
         self.overlap_spinbox.setVisible(mode == "Consequent")
+        self.sequence_request_label.setVisible(mode == "Consequent")
+        self.sequence_request_combo.setVisible(mode == "Consequent")
         self.save_config()
         self.update_cost_estimate()
 
@@ -443,11 +1042,16 @@ class MainWindow(QMainWindow):
         self.save_config()
         self.update_cost_estimate()
 
+    def update_sequence_request(self, sequence_request):
+        self.sequence_request = sequence_request
+        self.save_config()
+        self.update_cost_estimate()
+
     def update_detail_mode(self, mode):
         self.detail_mode = mode
         self.save_config()
         self.update_cost_estimate()
 
     def update_cost_estimate(self):
-        cost = calculate_token_cost(self.screenshots_source_folder, self.detail_mode, self.image_treatment_mode, self.sequence_length, self.overlap)
+        cost = calculate_token_cost(self.screenshots_source_folder, self.detail_mode, self.image_treatment_mode, self.sequence_length, self.overlap, self.sequence_request)
         self.cost_label.setText(f"Estimated Token Cost: {cost}")
\ No newline at end of file
@@ -0,0 +1,199 @@
+import io
+import os
+import base64
+import hashlib
+import threading
+from collections import OrderedDict
+from dotenv import load_dotenv
+from PIL import Image
+
+load_dotenv()
+
+# Images are resized to what the model actually looks at for the detail mode and re-encoded before
+# they are uploaded. JPEG or WEBP; "ORIGINAL" sends the files unchanged.
+IMAGE_UPLOAD_FORMAT = os.getenv("IMAGE_UPLOAD_FORMAT", "JPEG").upper()
+# Encoded size aimed for, in bits per pixel of the resized image. The quality is lowered until the
+# image fits, but not below IMAGE_MIN_QUALITY.
+IMAGE_TARGET_BITS_PER_PIXEL = 2.0
+IMAGE_MAX_QUALITY = 90
+IMAGE_MIN_QUALITY = 50
+# Encoded images kept in memory for reuse within the process, 0 disables it
+IMAGE_PAYLOAD_CACHE_MB = int(os.getenv("IMAGE_PAYLOAD_CACHE_MB", 64))
+MIME_TYPES = {"JPEG": "image/jpeg", "PNG": "image/png", "WEBP": "image/webp", "GIF": "image/gif"}
+
+
+def detail_size(width, height, detail_mode):
+    # Low detail sees a version that fits in 512x512. High detail fits the image in 2048x2048 and
+    # then scales the shortest side down to 768; Auto may choose high detail, so it gets the same
+    # bound. Images are never scaled up.
+    if detail_mode == "Low":
+        scale = min(1.0, 512 / max(width, height))
+    else:
+        scale = min(1.0, 2048 / max(width, height), 768 / min(width, height))
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def flatten(img):
+    # Transparent areas are put on white, neither JPEG nor the model need an alpha channel
+    if img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info):
+        img = img.convert("RGBA")
+        background = Image.new("RGB", img.size, (255, 255, 255))
+        background.paste(img, mask=img.getchannel("A"))
+        return background
+    return img.convert("RGB") if img.mode != "RGB" else img
+
+
+def save_image(img, upload_format, quality):
+    buffer = io.BytesIO()
+    if upload_format == "JPEG":
+        img.save(buffer, "JPEG", quality=quality, optimize=True)
+    else:
+        img.save(buffer, upload_format, quality=quality)
+    return buffer.getvalue()
+
+
+def encode_to_target(img, upload_format, target_bytes):
+    # Highest quality (in steps of a few points) whose output fits target_bytes
+    data = save_image(img, upload_format, IMAGE_MAX_QUALITY)
+    if len(data) <= target_bytes:
+        return data
+    low, high = IMAGE_MIN_QUALITY, IMAGE_MAX_QUALITY
+    best = save_image(img, upload_format, low)
+    while high - low > 5:
+        quality = (low + high) // 2
+        data = save_image(img, upload_format, quality)
+        if len(data) <= target_bytes:
+            low, best = quality, data
+        else:
+            high = quality
+    return best
+
+
+class UploadStats:
+    # Savings of one run. Every run counts its own, so concurrent runs neither mix nor clear each
+    # other's counts.
+    def __init__(self):
+        self.images = 0
+        self.encoded = 0
+        self.original_bytes = 0
+        self.upload_bytes = 0
+        self._lock = threading.Lock()
+
+    def record(self, original_bytes, upload_bytes, encoded):
+        with self._lock:
+            self.images += 1
+            self.encoded += encoded
+            self.original_bytes += original_bytes
+            self.upload_bytes += upload_bytes
+
+    def report(self):
+        with self._lock:
+            images, encoded, original_bytes, upload_bytes = self.images, self.encoded, self.original_bytes, self.upload_bytes
+        if images:
+            saved = original_bytes - upload_bytes
+            print(
+                f"Image preprocessing: {images} images ({encoded} encoded, {images - encoded} reused), "
+                f"{original_bytes / 1024 / 1024:.1f} MB on disk, {upload_bytes / 1024 / 1024:.1f} MB uploaded "
+                f"({saved / 1024 / 1024:.1f} MB, {saved / original_bytes:.0%} saved)"
+            )
+
+
+def preprocessing_key(source_hashes, detail_mode, *settings):
+    # Identifies an uploaded image by the sha256 of its source files and the settings it was made
+    # with, unlike the encoded bytes this does not change with the Pillow version
+    size_mode = "Low" if detail_mode == "Low" else "High"
+    return ":".join([*source_hashes, size_mode, IMAGE_UPLOAD_FORMAT, str(IMAGE_TARGET_BITS_PER_PIXEL), str(IMAGE_MAX_QUALITY), str(IMAGE_MIN_QUALITY), *map(str, settings)])
+
+
+class ImageDataUrl(str):
+    # Data URL of an uploaded image which also carries the image's (width, height), so the rate
+    # limiter can estimate its tokens without decoding the payload again, and its source_key (see
+    # preprocessing_key), which the response cache uses in place of the payload
+    def __new__(cls, url, size, source_key=None):
+        data_url = super().__new__(cls, url)
+        data_url.size = size
+        data_url.source_key = source_key
+        return data_url
+
+
+def prepare_image(image_path, detail_mode):
+    # Returns the original bytes, the bytes to upload, their MIME type and the uploaded (width, height). The original
+    # file is kept when re-encoding would not make it smaller; the token cost is the same either way since the API
+    # resizes too.
+    with open(image_path, "rb") as image_file:
+        original = image_file.read()
+    if IMAGE_UPLOAD_FORMAT not in ("JPEG", "WEBP", "ORIGINAL"):
+        raise Exception(f"Unsupported IMAGE_UPLOAD_FORMAT: {IMAGE_UPLOAD_FORMAT}")
+    with Image.open(io.BytesIO(original)) as img:
+        original_mime = MIME_TYPES.get(img.format, "image/jpeg")
+        upload_size = img.size
+        if IMAGE_UPLOAD_FORMAT == "ORIGINAL":
+            data, mime_type = original, original_mime
+        else:
+            size = detail_size(img.width, img.height, detail_mode)
+            resized = flatten(img)
+            if size != img.size:
+                resized = resized.resize(size, Image.LANCZOS)
+            target_bytes = int(size[0] * size[1] * IMAGE_TARGET_BITS_PER_PIXEL / 8)
+            data = encode_to_target(resized, IMAGE_UPLOAD_FORMAT, target_bytes)
+            mime_type = MIME_TYPES[IMAGE_UPLOAD_FORMAT]
+            upload_size = size
+            if len(data) >= len(original):
+                data, mime_type, upload_size = original, original_mime, img.size
+    return original, data, mime_type, upload_size
+
+
+class PayloadCache:
+    # Data URLs of encoded images, so images shared by overlapping sequences, near-duplicate groups
+    # or several runs over the same folder are read and encoded once per process. Entries are keyed
+    # by the file's path, size and modification time; least recently used ones are dropped past
+    # max_mb. Threads asking for an image that is being encoded wait for it instead of encoding it
+    # again.
+    def __init__(self, max_mb=None):
+        self.max_bytes = (IMAGE_PAYLOAD_CACHE_MB if max_mb is None else max_mb) * 1024 * 1024
+        self.size = 0
+        self._entries = OrderedDict()
+        self._encoding = {}
+        self._lock = threading.Lock()
+
+    def get(self, image_path, detail_mode):
+        # Returns (image_url, original_bytes, upload_bytes, encoded)
+        stat = os.stat(image_path)
+        # High and Auto upload the same image
+        key = (os.path.abspath(image_path), stat.st_size, stat.st_mtime_ns, detail_mode == "Low")
+        while True:
+            with self._lock:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    return self._entries[key] + (False,)
+                pending = self._encoding.get(key)
+                if pending is None:
+                    pending = self._encoding[key] = threading.Event()
+                    break
+            pending.wait()
+        try:
+            original, data, mime_type, upload_size = prepare_image(image_path, detail_mode)
+            source_key = preprocessing_key([hashlib.sha256(original).hexdigest()], detail_mode)
+            entry = (ImageDataUrl(f"data:{mime_type};base64,{base64.b64encode(data).decode('utf-8')}", upload_size, source_key), len(original), len(data))
+            with self._lock:
+                if len(entry[0]) <= self.max_bytes:
+                    self._entries[key] = entry
+                    self.size += len(entry[0])
+                    while self.size > self.max_bytes:
+                        _, (evicted_url, _, _) = self._entries.popitem(last=False)
+                        self.size -= len(evicted_url)
+        finally:
+            with self._lock:
+                del self._encoding[key]
+            pending.set()
+        return entry + (True,)
+
+
+payload_cache = PayloadCache()
+
+
+def image_data_url(image_path, detail_mode, upload_stats=None):
+    image_url, original_bytes, upload_bytes, encoded = payload_cache.get(image_path, detail_mode)
+    if upload_stats is not None:
+        upload_stats.record(original_bytes, upload_bytes, encoded)
+    return image_url
@@ -1,13 +1,22 @@
 import os
 import openai
-from utils import generate_description_independent
+from utils import encode_image, build_independent_messages, request_description
+from dedup import group_near_duplicates
+from request_executor import OPENAI_MAX_CONCURRENCY, ordered_requests
+from retries import classify_error, failed_row, not_sent_error
+from response_cache import response_cache
+from image_preprocessing import UploadStats
+from run_journal import RunJournal
+from manifest import list_images
 
-def process_screenshots_independent(screenshots_folder, prompt, detail_mode, progress_callback=None):
+def process_screenshots_independent(screenshots_folder, prompt, detail_mode, progress_callback=None, dedup_radius=None, max_concurrency=None, resume=False, row_callback=None):
     openai.api_key = os.getenv("OPENAI_API_KEY")
     model = os.getenv("OPENAI_MODEL")
     max_tokens = int(os.getenv("OPENAI_MAX_TOKENS", 100))
+    max_concurrency = max_concurrency or OPENAI_MAX_CONCURRENCY
 
-    image_files = [f for f in os.listdir(screenshots_folder) if f.endswith(".jpg") or f.endswith(".png")]
+    image_files = list_images(screenshots_folder)
+    # Only kept without a row_callback, see RunJournal
     descriptions = []
 
     print("Querying AI with the following parameters:")
@@ -16,13 +25,105 @@ def process_screenshots_independent(screenshots_folder, prompt, detail_mode, pro
     print(f"Prompt: {prompt}")
     print(f"Detail Mode: {detail_mode}")
     print(f"Number of Images: {len(image_files)}")
+    print(f"Concurrent Requests: {max_concurrency}")
+
+    # Near-duplicate keyframes are described once, the others reuse the description of their group
+    image_paths = [os.path.join(screenshots_folder, image_file) for image_file in image_files]
+    if dedup_radius is not None:
+        representatives = group_near_duplicates(image_paths, dedup_radius)
+    else:
+        representatives = list(range(len(image_files)))
+    unique_indices = sorted(set(representatives))
+    if dedup_radius is not None:
+        print(f"Near-duplicate elimination (radius {dedup_radius}): {len(unique_indices)} unique images, {len(image_files) - len(unique_indices)} requests saved")
     print("Messages:")
 
-    for i, image_file in enumerate(image_files, start=1):
-        image_path = os.path.join(screenshots_folder, image_file)
-        description = generate_description_independent(openai, model, max_tokens, image_path, prompt, detail_mode)
-        descriptions.append({"Image": image_file, "Description": description})
-        if progress_callback:
-            progress_callback(i, len(image_files))
+    # Resuming skips the images already described
+    settings = {"mode": "Independent", "prompt": prompt, "detail_mode": detail_mode, "dedup_radius": dedup_radius, "model": model, "max_tokens": max_tokens}
+    journal = RunJournal(screenshots_folder, settings, resume)
+    unique_descriptions = {
+        index: journal.completed[image_files[index]]["Description"]
+        for index in unique_indices if image_files[index] in journal.completed
+    }
+    pending_indices = [index for index in unique_indices if index not in unique_descriptions]
+    # A description is dropped once the last image of its group has its row
+    last_use = {representative: i for i, representative in enumerate(representatives)}
+    next_row = 0
+    failed = 0
+
+    # A failing image becomes a failed row (the error is passed along instead of raised). After an
+    # error that would fail every other request as well, nothing more is sent: the remaining images
+    # become failed rows without a request and the descriptions already paid for are returned.
+    fatal_errors = []
+    upload_stats = UploadStats()
+
+    def prepare(index):
+        if fatal_errors:
+            return index, None
+        try:
+            return index, build_independent_messages(encode_image(image_paths[index], detail_mode, upload_stats), prompt, detail_mode)
+        except Exception as e:
+            return index, e
+
+    def send(prepared):
+        index, messages = prepared
+        if fatal_errors:
+            return not_sent_error(fatal_errors[0])
+        if isinstance(messages, Exception):
+            description = messages
+        else:
+            try:
+                description = request_description(openai, model, max_tokens, messages)
+            except Exception as e:
+                if classify_error(e) == "fatal":
+                    fatal_errors.append(e)
+                description = e
+        if isinstance(description, Exception):
+            journal.record(image_files[index], failed_row(image_files[index], description))
+        else:
+            journal.record(image_files[index], {"Image": image_files[index], "Description": description})
+        return description
+
+    def emit_ready_rows():
+        # Rows are final, in file order, as soon as the description of their group is known. A group
+        # is described through its first image, so this keeps up with the requests.
+        nonlocal next_row
+        while next_row < len(image_files) and representatives[next_row] in unique_descriptions:
+            image_file = image_files[next_row]
+            representative = representatives[next_row]
+            description = unique_descriptions[representative]
+            if last_use[representative] == next_row:
+                del unique_descriptions[representative]
+            next_row += 1
+            if isinstance(description, Exception):
+                row = {"Image": image_file, "Description": "", "Error": str(description)}
+            else:
+                row = {"Image": image_file, "Description": description}
+            if row_callback:
+                row_callback(row)
+            else:
+                descriptions.append(row)
+
+    # Requests run concurrently, results still arrive in file order
+    with journal:
+        emit_ready_rows()
+        # A resumed run that has nothing left to send is complete right away
+        if progress_callback and unique_indices and not pending_indices:
+            progress_callback(len(unique_indices), len(unique_indices))
+        requests = ordered_requests(pending_indices, prepare, send, max_concurrency)
+        for i, (index, description) in enumerate(requests, start=len(unique_indices) - len(pending_indices) + 1):
+            unique_descriptions[index] = description
+            if isinstance(description, Exception):
+                failed += 1
+            emit_ready_rows()
+            if progress_callback:
+                progress_callback(i, len(unique_indices))
+
+    response_cache.report()
+    upload_stats.report()
+    if failed:
+        print(f"{failed} of {len(unique_indices)} requests failed, see the Error column")
+    if fatal_errors:
+        print(f"Run stopped, no more requests were sent after: {str(fatal_errors[0])}")
 
-    return descriptions
\ No newline at end of file
+    return descriptions if row_callback is None else next_row
\ No newline at end of file
@@ -0,0 +1,95 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+
+KEYFRAME_WRITER_THREADS = 2
+KEYFRAME_WRITER_QUEUE = 8
+
+
+class KeyframeWriter:
+    # Encodes and writes keyframes on background threads so decoding does not wait for JPEG
+    # encoding or slow storage. At most max_pending frames are queued, after that submit() blocks
+    # until a write finishes, which keeps memory bounded when storage cannot keep up.
+    # on_written is called with the path of every keyframe once it is on disk, from a writer thread,
+    # in the order the keyframes were submitted (frame order), so consumers never see a later
+    # keyframe before an earlier one that is still being written.
+    def __init__(self, threads=KEYFRAME_WRITER_THREADS, max_pending=KEYFRAME_WRITER_QUEUE, on_written=None):
+        self._executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="keyframe-writer")
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._errors = []
+        self._errors_lock = threading.Lock()
+        self.on_written = on_written
+        self.written = 0
+        self._submitted = 0
+        self._finished = {}
+        self._next_report = 0
+        self._report_lock = threading.Lock()
+
+    def _next_order(self):
+        with self._errors_lock:
+            order = self._submitted
+            self._submitted += 1
+        return order
+
+    def submit(self, keyframe_path, frame):
+        self._slots.acquire()
+        order = self._next_order()
+        try:
+            self._executor.submit(self._write, order, keyframe_path, frame)
+        except Exception:
+            self._report(order, None)
+            self._slots.release()
+            raise
+
+    def submit_existing(self, keyframe_path):
+        # A keyframe already on disk is reported in its place among the written ones
+        self._report(self._next_order(), keyframe_path)
+
+    def _write(self, order, keyframe_path, frame):
+        written_path = None
+        try:
+            if not cv2.imwrite(keyframe_path, frame):
+                raise Exception("cv2.imwrite returned False")
+            with self._errors_lock:
+                self.written += 1
+            written_path = keyframe_path
+        except Exception as e:
+            with self._errors_lock:
+                self._errors.append((keyframe_path, str(e)))
+        finally:
+            self._report(order, written_path)
+            self._slots.release()
+
+    def _report(self, order, keyframe_path):
+        # A write that finishes early waits here for the ones submitted before it, failed writes
+        # (None) are passed over
+        with self._report_lock:
+            self._finished[order] = keyframe_path
+            while self._next_report in self._finished:
+                ready_path = self._finished.pop(self._next_report)
+                self._next_report += 1
+                if ready_path is None or not self.on_written:
+                    continue
+                try:
+                    self.on_written(ready_path)
+                except Exception as e:
+                    with self._errors_lock:
+                        self._errors.append((ready_path, str(e)))
+
+    def close(self):
+        # Waits for every queued write and raises if any of them failed
+        self._executor.shutdown(wait=True)
+        if self._errors:
+            details = "; ".join(f"{path}: {error}" for path, error in self._errors[:5])
+            raise Exception(f"Failed to write {len(self._errors)} keyframes: {details}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            # Keep the original error, but still do not leave writes running in the background
+            self._executor.shutdown(wait=True)
+        return False
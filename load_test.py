@@ -0,0 +1,189 @@
+import os
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+import urllib.request
+import numpy as np
+import openai
+import rate_limiter
+from rate_limiter import rate_limiter as shared_rate_limiter
+from retries import retry_budget
+from response_cache import response_cache
+from manifest import is_image_file
+from independent_mode import process_screenshots_independent
+from sequential_mode import process_screenshots_sequential
+from mock_openai_server import MockServer, add_mock_arguments, mock_settings
+
+# Runs the description stage (Independent and Consequent treatment) against the mock chat
+# completions server and reports throughput, request latency percentiles and how injected rate
+# limits and server errors were recovered from. Only the base URL differs from a real run: the
+# same rate limiter, retries, executor and journal are used.
+LATENCY_PERCENTILES = (50, 95, 99)
+
+
+class RequestTimer:
+    # Times every description request as the pipeline sees it: rate limiter waits, retries and
+    # backoff included. Wraps rate_limiter.send_chat_completion for the duration of a run.
+    def __init__(self):
+        self.latencies = []
+        self.failures = 0
+        self._lock = threading.Lock()
+        self._send = None
+
+    def __enter__(self):
+        self._send = rate_limiter.send_chat_completion
+
+        def timed_send(client, **request):
+            started = time.monotonic()
+            try:
+                return self._send(client, **request)
+            except Exception:
+                with self._lock:
+                    self.failures += 1
+                raise
+            finally:
+                with self._lock:
+                    self.latencies.append(time.monotonic() - started)
+
+        rate_limiter.send_chat_completion = timed_send
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        rate_limiter.send_chat_completion = self._send
+        return False
+
+
+def percentiles(latencies):
+    if not latencies:
+        return {f"p{percentile}": None for percentile in LATENCY_PERCENTILES}
+    values = np.percentile(np.asarray(latencies), LATENCY_PERCENTILES)
+    return {f"p{percentile}": round(float(value), 3) for percentile, value in zip(LATENCY_PERCENTILES, values)}
+
+
+def server_stats(server, base_url):
+    if server is not None:
+        return server.stats.snapshot()
+    with urllib.request.urlopen(base_url.rstrip("/") + "/stats") as response:
+        return json.load(response)
+
+
+def copy_images(folder):
+    # The run writes its journal and manifest into a scratch copy of the folder
+    scratch = tempfile.mkdtemp(prefix="load_test_")
+    for name in os.listdir(folder):
+        if is_image_file(name):
+            shutil.copy2(os.path.join(folder, name), scratch)
+    return scratch
+
+
+def run_mode(mode, folder, args, server, base_url):
+    before = server_stats(server, base_url)
+    rate_limited_before = shared_rate_limiter.rate_limited
+    # Rows are only counted, like the GUI the run keeps none of them in memory
+    failed_rows = 0
+
+    def count_row(row):
+        nonlocal failed_rows
+        if row.get("Error"):
+            failed_rows += 1
+
+    started = time.monotonic()
+    with RequestTimer() as timer:
+        if mode == "Independent":
+            rows = process_screenshots_independent(folder, args.prompt, args.detail_mode, max_concurrency=args.concurrency, row_callback=count_row)
+        else:
+            rows = process_screenshots_sequential(folder, args.prompt, args.sequence_length, args.overlap, args.detail_mode,
+                                                  sequence_request=args.sequence_request, row_callback=count_row, confirm=False)
+    elapsed = time.monotonic() - started
+    after = server_stats(server, base_url)
+
+    responses = {status: after["responses"].get(status, 0) - before["responses"].get(status, 0) for status in after["responses"]}
+    attempts = after["requests"] - before["requests"]
+    server_latencies = after["latencies"][len(before["latencies"]):]
+    return {
+        "mode": mode,
+        "rows": rows,
+        "failed_rows": failed_rows,
+        "requests": len(timer.latencies),
+        "failed_requests": timer.failures,
+        "attempts": attempts,
+        "retries": max(0, attempts - len(timer.latencies)),
+        "responses": {str(status): count for status, count in sorted(responses.items(), key=lambda item: str(item[0])) if count},
+        "rate_limit_pauses": shared_rate_limiter.rate_limited - rate_limited_before,
+        "retry_budget_left": round(retry_budget.balance, 1),
+        "seconds": round(elapsed, 3),
+        "rows_per_second": round(rows / elapsed, 3) if elapsed else None,
+        "requests_per_second": round(len(timer.latencies) / elapsed, 3) if elapsed else None,
+        "latency": percentiles(timer.latencies),
+        "server_latency": percentiles(server_latencies),
+        "prompt_tokens": after["prompt_tokens"] - before["prompt_tokens"],
+        "completion_tokens": after["completion_tokens"] - before["completion_tokens"],
+    }
+
+
+def print_report(result):
+    print(f"\n=== {result['mode']} ===")
+    print(f"Rows: {result['rows']} ({result['failed_rows']} failed) in {result['seconds']:.2f}s, {result['rows_per_second']} rows/s")
+    print(f"Requests: {result['requests']} ({result['failed_requests']} failed after retries), {result['requests_per_second']} requests/s")
+    latency = result["latency"]
+    server_latency = result["server_latency"]
+    print(f"Request latency (s): p50 {latency['p50']}  p95 {latency['p95']}  p99 {latency['p99']}  (with rate limiter waits and retries)")
+    print(f"Server latency (s):  p50 {server_latency['p50']}  p95 {server_latency['p95']}  p99 {server_latency['p99']}  (per attempt)")
+    responses = ", ".join(f"{status}: {count}" for status, count in result["responses"].items())
+    print(f"Attempts: {result['attempts']} ({responses}), {result['retries']} retries, {result['rate_limit_pauses']} rate limit pauses, retry budget left {result['retry_budget_left']}")
+    print(f"Tokens: {result['prompt_tokens']} prompt, {result['completion_tokens']} completion")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test of the description stage against a mock chat completions API")
+    parser.add_argument("folder", help="screenshots folder, its images are copied to a scratch folder for every run")
+    parser.add_argument("--modes", default="Independent,Consequent", help="comma separated: Independent, Consequent")
+    parser.add_argument("--prompt", default="Describe the image.")
+    parser.add_argument("--detail-mode", choices=("Low", "High", "Auto"), default="Low")
+    parser.add_argument("--concurrency", type=int, default=None, help="Independent mode, default OPENAI_MAX_CONCURRENCY")
+    parser.add_argument("--sequence-length", type=int, default=3)
+    parser.add_argument("--overlap", type=int, default=1)
+    parser.add_argument("--sequence-request", choices=("Multiple Images", "Mosaic"), default="Multiple Images")
+    parser.add_argument("--base-url", default=None, help="use an already running mock_openai_server.py instead of starting one")
+    parser.add_argument("--report", default=None, help="also write the results to this JSON file")
+    add_mock_arguments(parser)
+    args = parser.parse_args()
+
+    server = None
+    if args.base_url is None:
+        server = MockServer(mock_settings(args)).start()
+    base_url = args.base_url or server.base_url
+    # Every request has to reach the mock: no cached responses, and no real key or model needed
+    response_cache.max_bytes = 0
+    openai.base_url = base_url
+    os.environ["OPENAI_API_KEY"] = "mock"
+    os.environ.setdefault("OPENAI_MODEL", "mock-model")
+    print(f"Load testing against {base_url}")
+
+    results = []
+    try:
+        for mode in [mode.strip() for mode in args.modes.split(",") if mode.strip()]:
+            if mode not in ("Independent", "Consequent"):
+                raise Exception(f"Unknown mode: {mode}")
+            folder = copy_images(args.folder)
+            try:
+                results.append(run_mode(mode, folder, args, server, base_url))
+            finally:
+                shutil.rmtree(folder, ignore_errors=True)
+    finally:
+        if server is not None:
+            server.stop()
+
+    for result in results:
+        print_report(result)
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as report_file:
+            json.dump(results, report_file, indent=1)
+        print(f"\nReport saved to {args.report}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+import os
+import re
+import json
+import hashlib
+import threading
+import numpy as np
+from PIL import Image
+
+# Written into every screenshots folder, lists the images in frame order with their size,
+# dimensions, content hash and position in the source video
+MANIFEST_FILENAME = "screenshot_manifest.json"
+MANIFEST_VERSION = 1
+
+
+def is_image_file(name):
+    return name.endswith(".jpg") or name.endswith(".png")
+
+
+def natural_key(name):
+    # "keyframe_99.jpg" sorts before "keyframe_100.jpg", whatever the zero padding
+    return [int(part) if part.isdigit() else part.lower() for part in re.split(r"(\d+)", name)]
+
+
+def frame_number(name):
+    # Keyframes are named after their frame number, other files may have none
+    numbers = re.findall(r"\d+", os.path.splitext(name)[0])
+    return int(numbers[-1]) if numbers else None
+
+
+def format_timecode(seconds):
+    hours, remainder = divmod(seconds, 3600)
+    minutes, seconds = divmod(remainder, 60)
+    return f"{int(hours):02d}:{int(minutes):02d}:{seconds:06.3f}"
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as image_file:
+        for block in iter(lambda: image_file.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class FolderManifests:
+    # Manifests of the screenshots folders used in this process. A refresh scans the folder and
+    # only opens (header only) and hashes files whose size or modification time changed, then
+    # writes the manifest back if anything did. Every stage reads its file list from here. Hashing
+    # reads every new file in full, so refreshes that only need the sizes (the token estimate on
+    # the GUI thread) skip it and leave the hash to the processing threads.
+    def __init__(self):
+        self._manifests = {}
+        self._lock = threading.Lock()
+
+    def _load(self, folder):
+        manifest = self._manifests.get(folder)
+        if manifest is None:
+            path = os.path.join(folder, MANIFEST_FILENAME)
+            try:
+                with open(path, "r", encoding="utf-8") as manifest_file:
+                    manifest = json.load(manifest_file)
+                if manifest.get("version") != MANIFEST_VERSION:
+                    manifest = None
+            except (OSError, ValueError):
+                manifest = None
+            manifest = manifest or {"version": MANIFEST_VERSION, "source": None, "images": []}
+            self._manifests[folder] = manifest
+        return manifest
+
+    def _save(self, folder, manifest):
+        path = os.path.join(folder, MANIFEST_FILENAME)
+        temp_path = path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as manifest_file:
+            json.dump(manifest, manifest_file)
+        os.replace(temp_path, path)
+
+    def _set_timecode(self, manifest, entry):
+        fps = (manifest["source"] or {}).get("fps")
+        entry["timecode"] = format_timecode(entry["frame"] / fps) if fps and entry["frame"] is not None else None
+
+    def refresh(self, folder, hashes=True):
+        folder = os.path.abspath(folder)
+        with self._lock:
+            manifest = self._load(folder)
+            known = {entry["name"]: entry for entry in manifest["images"]}
+            images = []
+            changed = 0
+            hashed = 0
+            kept = 0
+            with os.scandir(folder) as scan:
+                for dir_entry in scan:
+                    if not is_image_file(dir_entry.name):
+                        continue
+                    stat = dir_entry.stat()
+                    entry = known.get(dir_entry.name)
+                    kept += entry is not None
+                    if entry is None or entry["size"] != stat.st_size or entry["mtime_ns"] != stat.st_mtime_ns:
+                        with Image.open(dir_entry.path) as img:
+                            width, height = img.size
+                        entry = {
+                            "name": dir_entry.name,
+                            "size": stat.st_size,
+                            "mtime_ns": stat.st_mtime_ns,
+                            "width": width,
+                            "height": height,
+                            "sha256": None,
+                            "frame": frame_number(dir_entry.name),
+                        }
+                        self._set_timecode(manifest, entry)
+                        changed += 1
+                    if hashes and entry["sha256"] is None:
+                        entry["sha256"] = file_hash(dir_entry.path)
+                        hashed += 1
+                    images.append(entry)
+            images.sort(key=lambda entry: natural_key(entry["name"]))
+            removed = len(known) - kept
+            if changed or removed or hashed:
+                manifest["images"] = images
+                self._save(folder, manifest)
+                print(f"Manifest of {folder}: {changed} images indexed, {hashed} hashed, {removed} removed, {len(images)} in total")
+            return list(manifest["images"])
+
+    def set_source(self, folder, video_path, fps):
+        # Lets the manifest give the video timecode of every keyframe
+        folder = os.path.abspath(folder)
+        with self._lock:
+            manifest = self._load(folder)
+            manifest["source"] = {"video": os.path.abspath(video_path), "fps": fps}
+            for entry in manifest["images"]:
+                self._set_timecode(manifest, entry)
+            self._save(folder, manifest)
+
+
+folder_manifests = FolderManifests()
+
+
+def list_images(folder):
+    # Image file names in frame order
+    return [entry["name"] for entry in folder_manifests.refresh(folder)]
+
+
+def image_entries(folder):
+    # Manifest entries by file name, in frame order, with their dimensions and sha256
+    return {entry["name"]: entry for entry in folder_manifests.refresh(folder)}
+
+
+def image_sizes(folder):
+    # Image file names in frame order and an (n, 2) array of their widths and heights. Only the
+    # headers of new files are read, their hashes are left to the run that processes them.
+    images = folder_manifests.refresh(folder, hashes=False)
+    sizes = np.array([(entry["width"], entry["height"]) for entry in images], dtype=np.int64).reshape(-1, 2)
+    return [entry["name"] for entry in images], sizes
@@ -0,0 +1,271 @@
+import json
+import math
+import time
+import random
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from rate_limiter import estimate_request_tokens
+
+# Stand-in for the chat completions endpoint, so the description stage can be load tested and
+# benchmarked without API cost. Speaks the same wire format as the API (request body, response
+# body, error body, rate limit headers) with configurable latency, injected errors and usage.
+MOCK_DEFAULT_PORT = 8765
+LATENCY_DISTRIBUTIONS = ("constant", "uniform", "lognormal")
+SERVER_ERROR_CODES = (500, 502, 503)
+
+
+class MockSettings:
+    def __init__(self, latency_ms=500.0, latency_distribution="lognormal", latency_spread=0.5, rate_limit_rate=0.0,
+                 server_error_rate=0.0, retry_after_ms=1000, rpm=0, tpm=0, seed=None):
+        if latency_distribution not in LATENCY_DISTRIBUTIONS:
+            raise Exception(f"Unknown latency distribution: {latency_distribution}")
+        self.latency_ms = latency_ms
+        self.latency_distribution = latency_distribution
+        # Half width of the uniform range as a share of the mean, or sigma of the lognormal
+        self.latency_spread = latency_spread
+        self.rate_limit_rate = rate_limit_rate
+        self.server_error_rate = server_error_rate
+        self.retry_after_ms = retry_after_ms
+        # Enforced per-minute limits, reported in the x-ratelimit headers (0 = unlimited)
+        self.rpm = rpm
+        self.tpm = tpm
+        self.seed = seed
+
+
+class MockStats:
+    # Counts every attempt the server answered, including the injected errors
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.responses = {}
+            self.latencies = []
+            self.prompt_tokens = 0
+            self.completion_tokens = 0
+
+    def record(self, status, latency, usage=None):
+        with self._lock:
+            self.responses[status] = self.responses.get(status, 0) + 1
+            self.latencies.append(latency)
+            if usage:
+                self.prompt_tokens += usage["prompt_tokens"]
+                self.completion_tokens += usage["completion_tokens"]
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "requests": sum(self.responses.values()),
+                "responses": dict(self.responses),
+                "prompt_tokens": self.prompt_tokens,
+                "completion_tokens": self.completion_tokens,
+                "latencies": list(self.latencies),
+            }
+
+
+class MinuteWindow:
+    # Requests and tokens accepted in the last minute, for the enforced limits and the headers
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = []
+
+    def try_add(self, tokens, rpm, tpm):
+        # Returns (accepted, remaining requests, remaining tokens, seconds until a slot frees up)
+        with self._lock:
+            now = time.monotonic()
+            self._entries = [entry for entry in self._entries if entry[0] > now - 60]
+            used_requests = len(self._entries)
+            used_tokens = sum(entry[1] for entry in self._entries)
+            accepted = (not rpm or used_requests < rpm) and (not tpm or used_tokens + tokens <= tpm)
+            if accepted:
+                self._entries.append((now, tokens))
+                used_requests += 1
+                used_tokens += tokens
+            reset = self._entries[0][0] + 60 - now if self._entries else 0.0
+            return accepted, max(0, rpm - used_requests), max(0, tpm - used_tokens), reset
+
+
+def mock_description(messages, max_tokens):
+    # Deterministic text, about four characters per token, cut at max_tokens like the API does
+    images = sum(1 for message in messages for part in message["content"] if part["type"] == "image_url")
+    words = f"Mock description of {images} image{'s' if images != 1 else ''}: a scene with people, objects and text.".split()
+    content = []
+    for word in words:
+        if max_tokens and (len(" ".join(content + [word])) // 4 + 1) > max_tokens:
+            return " ".join(content), "length"
+        content.append(word)
+    return " ".join(content), "stop"
+
+
+def make_handler(settings, stats, window, rng):
+    rng_lock = threading.Lock()
+
+    def sample_latency():
+        with rng_lock:
+            if settings.latency_distribution == "uniform":
+                spread = settings.latency_ms * settings.latency_spread
+                latency_ms = rng.uniform(settings.latency_ms - spread, settings.latency_ms + spread)
+            elif settings.latency_distribution == "lognormal":
+                # Mean latency_ms with a long right tail, like real completions
+                sigma = settings.latency_spread
+                latency_ms = rng.lognormvariate(math.log(max(settings.latency_ms, 1e-3)) - sigma ** 2 / 2, sigma)
+            else:
+                latency_ms = settings.latency_ms
+            return max(0.0, latency_ms) / 1000
+
+    def draw_error():
+        with rng_lock:
+            draw = rng.random()
+            if draw < settings.rate_limit_rate:
+                return 429
+            if draw < settings.rate_limit_rate + settings.server_error_rate:
+                return rng.choice(SERVER_ERROR_CODES)
+        return None
+
+    class MockHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def send_json(self, status, body, headers=None):
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("content-type", "application/json")
+            self.send_header("content-length", str(len(data)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def send_error_body(self, status, message, error_type, code=None, headers=None):
+            self.send_json(status, {"error": {"message": message, "type": error_type, "param": None, "code": code}}, headers)
+
+        def do_GET(self):
+            if self.path.rstrip("/").endswith("/stats"):
+                self.send_json(200, stats.snapshot())
+            else:
+                self.send_error_body(404, f"Unknown path {self.path}", "invalid_request_error")
+
+        def do_POST(self):
+            started = time.monotonic()
+            request = json.loads(self.rfile.read(int(self.headers.get("content-length", 0))) or b"{}")
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                self.send_error_body(404, f"Unknown path {self.path}", "invalid_request_error")
+                stats.record(404, time.monotonic() - started)
+                return
+            try:
+                messages = request["messages"]
+                max_tokens = request.get("max_tokens")
+                prompt_tokens = estimate_request_tokens(messages, 0)
+            except Exception as e:
+                self.send_error_body(400, f"Invalid request: {str(e)}", "invalid_request_error")
+                stats.record(400, time.monotonic() - started)
+                return
+
+            accepted, remaining_requests, remaining_tokens, reset = window.try_add(prompt_tokens + (max_tokens or 0), settings.rpm, settings.tpm)
+            headers = {}
+            if settings.rpm:
+                headers.update({"x-ratelimit-limit-requests": str(settings.rpm), "x-ratelimit-remaining-requests": str(remaining_requests), "x-ratelimit-reset-requests": f"{reset:.3f}s"})
+            if settings.tpm:
+                headers.update({"x-ratelimit-limit-tokens": str(settings.tpm), "x-ratelimit-remaining-tokens": str(remaining_tokens), "x-ratelimit-reset-tokens": f"{reset:.3f}s"})
+
+            status = 429 if not accepted else draw_error()
+            if status == 429:
+                # Rejected quickly, as the API does, with the pause the client should take
+                headers["retry-after-ms"] = str(round(reset * 1000) if not accepted else settings.retry_after_ms)
+                self.send_error_body(429, "Rate limit reached (mock)", "requests", "rate_limit_exceeded", headers)
+                stats.record(429, time.monotonic() - started)
+                return
+
+            time.sleep(sample_latency())
+            if status:
+                self.send_error_body(status, "The server had an error while processing your request (mock)", "server_error")
+                stats.record(status, time.monotonic() - started)
+                return
+
+            content, finish_reason = mock_description(messages, max_tokens)
+            usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(content) // 4 + 1}
+            usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+            self.send_json(200, {
+                "id": f"chatcmpl-mock-{time.time_ns()}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": request.get("model") or "mock",
+                "choices": [{"index": 0, "finish_reason": finish_reason, "message": {"role": "assistant", "content": content}}],
+                "usage": usage,
+            }, headers)
+            stats.record(200, time.monotonic() - started, usage)
+
+    return MockHandler
+
+
+class MockServer:
+    # Runs the mock on a background thread, port 0 picks a free port
+    def __init__(self, settings=None, host="127.0.0.1", port=0):
+        self.settings = settings or MockSettings()
+        self.stats = MockStats()
+        handler = make_handler(self.settings, self.stats, MinuteWindow(), random.Random(self.settings.seed))
+        self._server = ThreadingHTTPServer((host, port), handler)
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1/"
+
+    def serve_forever(self):
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+        return False
+
+
+def add_mock_arguments(parser):
+    parser.add_argument("--latency-ms", type=float, default=500.0, help="mean response latency")
+    parser.add_argument("--latency-distribution", choices=LATENCY_DISTRIBUTIONS, default="lognormal")
+    parser.add_argument("--latency-spread", type=float, default=0.5, help="uniform: half width as a share of the mean, lognormal: sigma")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="share of requests answered with 429")
+    parser.add_argument("--server-error-rate", type=float, default=0.0, help="share of requests answered with 500/502/503")
+    parser.add_argument("--retry-after-ms", type=int, default=1000, help="retry-after-ms header of injected 429s")
+    parser.add_argument("--rpm", type=int, default=0, help="enforced requests per minute (0 = unlimited)")
+    parser.add_argument("--tpm", type=int, default=0, help="enforced tokens per minute (0 = unlimited)")
+    parser.add_argument("--seed", type=int, default=None)
+
+
+def mock_settings(args):
+    return MockSettings(args.latency_ms, args.latency_distribution, args.latency_spread, args.rate_limit_rate,
+                        args.server_error_rate, args.retry_after_ms, args.rpm, args.tpm, args.seed)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local mock of the chat completions API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=MOCK_DEFAULT_PORT)
+    add_mock_arguments(parser)
+    args = parser.parse_args()
+    server = MockServer(mock_settings(args), args.host, args.port)
+    print(f"Mock chat completions API on {server.base_url} (set OPENAI_BASE_URL to it), statistics at {server.base_url}stats")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
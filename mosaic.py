@@ -0,0 +1,71 @@
+import os
+import math
+import base64
+from PIL import Image, ImageDraw, ImageFont
+from image_preprocessing import IMAGE_UPLOAD_FORMAT, IMAGE_TARGET_BITS_PER_PIXEL, MIME_TYPES, ImageDataUrl, detail_size, encode_to_target, flatten, preprocessing_key
+from rate_limiter import image_token_costs
+
+MOSAIC_BACKGROUND = (0, 0, 0)
+MOSAIC_LABEL_HEIGHT = 14
+
+
+def mosaic_layout(sizes, detail_mode):
+    # Picks the grid whose frames get the most pixels once the whole mosaic is scaled to what the
+    # model sees for the detail mode (see detail_size), so a sequence costs the tiles of one image.
+    # Cells have the size of the largest frame. Returns (columns, rows, cell_width, cell_height).
+    cell_width = max(width for width, _ in sizes)
+    cell_height = max(height for _, height in sizes)
+    layouts = []
+    for columns in range(1, len(sizes) + 1):
+        rows = math.ceil(len(sizes) / columns)
+        width, height = detail_size(columns * cell_width, rows * cell_height, detail_mode)
+        layouts.append((columns, rows, max(1, width // columns), max(1, height // rows)))
+    costs = image_token_costs([layout[0] * layout[2] for layout in layouts], [layout[1] * layout[3] for layout in layouts], detail_mode)
+    # Larger frames first, then the cheaper mosaic
+    best = max(range(len(layouts)), key=lambda i: (layouts[i][2] * layouts[i][3], -costs[i]))
+    return layouts[best]
+
+
+def mosaic_size(sizes, detail_mode):
+    # Size of the mosaic for frames of the given sizes
+    columns, rows, cell_width, cell_height = mosaic_layout(sizes, detail_mode)
+    return columns * cell_width, rows * cell_height
+
+
+def create_mosaic(image_paths, sizes, detail_mode, labels=None):
+    # Builds the labelled grid one frame at a time: every frame is opened, decoded at reduced size
+    # where the format allows it (JPEG draft mode), pasted and closed before the next one is read.
+    # The layout comes from the frame sizes the manifest indexed.
+    labels = labels or [os.path.splitext(os.path.basename(image_path))[0] for image_path in image_paths]
+    columns, rows, cell_width, cell_height = mosaic_layout(sizes, detail_mode)
+
+    mosaic = Image.new("RGB", (columns * cell_width, rows * cell_height), MOSAIC_BACKGROUND)
+    draw = ImageDraw.Draw(mosaic)
+    font = ImageFont.load_default()
+    for i, (image_path, label) in enumerate(zip(image_paths, labels)):
+        left = (i % columns) * cell_width
+        top = (i // columns) * cell_height
+        with Image.open(image_path) as img:
+            img.draft("RGB", (cell_width, cell_height))
+            frame = flatten(img)
+            frame.thumbnail((cell_width, cell_height), Image.LANCZOS)
+            mosaic.paste(frame, (left + (cell_width - frame.width) // 2, top + (cell_height - frame.height) // 2))
+        # Frame number and name in the top left corner, so the model can refer to the frames in order
+        text = f"{i + 1}: {label}"
+        text_width = draw.textlength(text, font=font)
+        draw.rectangle((left, top, left + text_width + 6, top + MOSAIC_LABEL_HEIGHT), fill=(0, 0, 0))
+        draw.text((left + 3, top + 1), text, fill=(255, 255, 255), font=font)
+    return mosaic
+
+
+def encode_mosaic(image_paths, images, detail_mode):
+    # Data URL of the mosaic, encoded like single images (ORIGINAL has no file to keep, so JPEG)
+    mosaic = create_mosaic(image_paths, [(image["width"], image["height"]) for image in images], detail_mode)
+    upload_format = IMAGE_UPLOAD_FORMAT if IMAGE_UPLOAD_FORMAT in ("JPEG", "WEBP") else "JPEG"
+    target_bytes = int(mosaic.width * mosaic.height * IMAGE_TARGET_BITS_PER_PIXEL / 8)
+    data = encode_to_target(mosaic, upload_format, target_bytes)
+    # Keyed by the frames' hashes from the manifest entries (images), and by their names, which
+    # are drawn into the mosaic
+    labels = [os.path.splitext(os.path.basename(image_path))[0] for image_path in image_paths]
+    source_key = preprocessing_key([image["sha256"] for image in images], detail_mode, "mosaic", MOSAIC_LABEL_HEIGHT, *labels)
+    return ImageDataUrl(f"data:{MIME_TYPES[upload_format]};base64,{base64.b64encode(data).decode('utf-8')}", mosaic.size, source_key)
@@ -0,0 +1,124 @@
+import os
+import queue
+import threading
+import openai
+from utils import generate_description_independent
+from video_processing import process_video
+from request_executor import OPENAI_MAX_CONCURRENCY
+from retries import classify_error, failed_row, not_sent_error
+from response_cache import response_cache
+from image_preprocessing import UploadStats
+
+# Keyframes waiting for a description worker. When the API is the bottleneck, a full queue blocks
+# the keyframe writers and through them the decoder, so memory stays bounded.
+PIPELINE_QUEUE_SIZE = 16
+
+
+class DescriptionPipeline:
+    # Describes keyframes on worker threads while they are still being produced. submit() takes the
+    # path of a keyframe that is already on disk, in frame order. Finished rows are passed on in
+    # the same order (a row waits for the ones submitted before it). close() waits for the queue to
+    # drain and returns the rows, or with a description_callback, which gets every row instead,
+    # only their number. An error of the callback (saving the row) stops the run like a fatal API
+    # error and is raised by close().
+    def __init__(self, prompt, detail_mode, workers=OPENAI_MAX_CONCURRENCY, max_queued=PIPELINE_QUEUE_SIZE, description_callback=None):
+        openai.api_key = os.getenv("OPENAI_API_KEY")
+        self.model = os.getenv("OPENAI_MODEL")
+        self.max_tokens = int(os.getenv("OPENAI_MAX_TOKENS", 100))
+        self.prompt = prompt
+        self.detail_mode = detail_mode
+        self.description_callback = description_callback
+        self.upload_stats = UploadStats()
+        self.submitted = 0
+        self._queue = queue.Queue(max_queued)
+        self.described = 0
+        self._rows = []
+        self._finished = {}
+        self._next_row = 0
+        self._fatal_error = None
+        self._callback_error = None
+        self._lock = threading.Lock()
+        self._threads = [threading.Thread(target=self._work, name=f"describer-{i}", daemon=True) for i in range(workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, image_path):
+        with self._lock:
+            order = self.submitted
+            self.submitted += 1
+        self._queue.put((order, image_path))
+
+    def _work(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            order, image_path = item
+            # Keep draining the queue, otherwise the producers would block forever. After an error
+            # that would fail every request, the remaining keyframes are not sent and only get a
+            # failed row.
+            stop_error = self._fatal_error or self._callback_error
+            if stop_error is not None:
+                row = {"Image": os.path.basename(image_path), "Description": "", "Error": str(not_sent_error(stop_error))}
+            else:
+                row = self._describe(image_path)
+            with self._lock:
+                self._finished[order] = row
+                while self._next_row in self._finished:
+                    ready_row = self._finished.pop(self._next_row)
+                    self._next_row += 1
+                    self.described += 1
+                    if self.description_callback:
+                        if self._callback_error is None:
+                            try:
+                                self.description_callback(ready_row)
+                            except Exception as e:
+                                self._callback_error = e
+                                print(f"Could not pass on the description of {ready_row['Image']}: {str(e)}")
+                    else:
+                        self._rows.append(ready_row)
+
+    def _describe(self, image_path):
+        try:
+            description = generate_description_independent(openai, self.model, self.max_tokens, image_path, self.prompt, self.detail_mode, self.upload_stats)
+        except Exception as e:
+            if classify_error(e) == "fatal":
+                self._fatal_error = e
+            return failed_row(os.path.basename(image_path), e)
+        print(f"Description ready for {os.path.basename(image_path)}")
+        return {"Image": os.path.basename(image_path), "Description": description}
+
+    def close(self):
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        response_cache.report()
+        self.upload_stats.report()
+        if self._fatal_error is not None:
+            print(f"Descriptions stopped, no more requests were sent after: {str(self._fatal_error)}")
+        if self._callback_error is not None:
+            raise self._callback_error
+        return self._rows if self.description_callback is None else self.described
+
+
+def run_pipeline(video_path, output_folder, sensitivity, prompt, detail_mode, description_callback=None, **video_options):
+    # Scene detection, keyframe extraction and description overlap: every keyframe is queued for
+    # description as soon as it is written, so a full run takes about as long as its slowest stage.
+    print("Running video processing and description as one pipeline")
+    print(f"Prompt: {prompt}")
+    print(f"Detail Mode: {detail_mode}")
+    describer = DescriptionPipeline(prompt, detail_mode, description_callback=description_callback)
+    try:
+        process_video(video_path, output_folder, sensitivity, keyframe_callback=describer.submit, **video_options)
+    except Exception:
+        # The descriptions still finish, but the video processing error is the one reported
+        try:
+            describer.close()
+        except Exception as e:
+            print(f"Error while finishing the descriptions: {str(e)}")
+        raise
+    print(f"Video processing done, waiting for {describer.submitted} descriptions")
+    descriptions = describer.close()
+    print("Pipeline completed.")
+    return descriptions
@@ -0,0 +1,206 @@
+import io
+import os
+import re
+import time
+import base64
+import sqlite3
+import threading
+import numpy as np
+from dotenv import load_dotenv
+from PIL import Image
+from openai.types.chat import ChatCompletion
+from response_cache import request_key, response_cache
+from retries import OPENAI_MAX_ATTEMPTS, backoff_delay, classify_error, retry_budget
+
+load_dotenv()
+
+# Starting limits, replaced by the real ones as soon as the API reports them in response headers
+OPENAI_RPM_LIMIT = int(os.getenv("OPENAI_RPM_LIMIT", 500))
+OPENAI_TPM_LIMIT = int(os.getenv("OPENAI_TPM_LIMIT", 30000))
+DEFAULT_RATE_LIMIT_PAUSE = 1.0
+
+
+def image_token_costs(widths, heights, detail_mode):
+    # Vision token cost of images given as arrays of sizes. Low detail is a flat 85 tokens. High
+    # detail fits the image in 2048x2048, scales the shortest side down to 768 and charges 170 per
+    # started 512px tile plus 85; Auto is counted as High, the most it can cost.
+    widths = np.asarray(widths, dtype=np.float64)
+    heights = np.asarray(heights, dtype=np.float64)
+    if detail_mode == "Low":
+        return np.full(widths.shape, 85, dtype=np.int64)
+    # Same rounding as image_preprocessing.detail_size, so uploaded images are estimated exactly
+    scale = np.minimum(np.minimum(1.0, 2048 / np.maximum(widths, heights)), 768 / np.minimum(widths, heights))
+    scaled_widths = np.maximum(1, np.round(widths * scale))
+    scaled_heights = np.maximum(1, np.round(heights * scale))
+    tiles = np.ceil(scaled_widths / 512) * np.ceil(scaled_heights / 512)
+    return (170 * tiles + 85).astype(np.int64)
+
+
+def image_token_cost(width, height, detail_mode):
+    return int(image_token_costs([width], [height], detail_mode)[0])
+
+
+def estimate_request_tokens(messages, max_tokens):
+    # Rate limits count the prompt plus max_tokens for the completion. Text is estimated at four
+    # characters per token, images by their size. Images encoded by this app carry their size (see
+    # ImageDataUrl), other data URLs (mock server, batch files) are decoded and PIL reads the header.
+    tokens = max_tokens or 0
+    for message in messages:
+        for part in message["content"]:
+            if part["type"] == "text":
+                tokens += len(part["text"]) // 4 + 1
+            elif part["type"] == "image_url":
+                url = part["image_url"]["url"]
+                size = getattr(url, "size", None)
+                if size is None:
+                    image_data = base64.b64decode(url[url.index(",") + 1:])
+                    with Image.open(io.BytesIO(image_data)) as img:
+                        size = img.size
+                width, height = size
+                tokens += image_token_cost(width, height, part["image_url"].get("detail", "auto").capitalize())
+    return tokens
+
+
+def parse_reset(value):
+    # Reset headers look like "1s", "6m0s", "20ms" or "1h2m3.5s"
+    seconds = 0.0
+    for amount, unit in re.findall(r"(\d+(?:\.\d+)?)(ms|h|m|s)", value or ""):
+        seconds += float(amount) * {"ms": 0.001, "s": 1, "m": 60, "h": 3600}[unit]
+    return seconds
+
+
+class TokenBucket:
+    # Holds up to a minute's worth of capacity and refills continuously
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.level = float(per_minute)
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.capacity / 60)
+        self.updated = now
+
+    def wait_time(self, amount):
+        # Requests larger than the whole bucket only wait for a full bucket
+        missing = min(amount, self.capacity) - self.level
+        return max(0.0, missing * 60 / self.capacity)
+
+
+class RateLimiter:
+    # Paces requests so they stay inside the requests-per-minute and tokens-per-minute quota.
+    # Every request is charged its estimated token cost before it is sent; response headers then
+    # correct both the limits and the remaining capacity, and a 429 pauses everyone until the
+    # provider says the limit has reset.
+    def __init__(self, rpm=OPENAI_RPM_LIMIT, tpm=OPENAI_TPM_LIMIT):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.paused_until = 0.0
+        self.rate_limited = 0
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.requests.refill(now)
+                self.tokens.refill(now)
+                wait = max(self.paused_until - now, self.requests.wait_time(1), self.tokens.wait_time(tokens))
+                if wait <= 0:
+                    self.requests.level -= 1
+                    self.tokens.level -= tokens
+                    return
+            time.sleep(wait)
+
+    def update_from_headers(self, headers):
+        with self._lock:
+            now = time.monotonic()
+            for bucket, kind in ((self.requests, "requests"), (self.tokens, "tokens")):
+                limit = headers.get(f"x-ratelimit-limit-{kind}")
+                remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+                bucket.refill(now)
+                if limit and float(limit) > 0:
+                    bucket.capacity = float(limit)
+                if remaining:
+                    bucket.level = min(bucket.level, float(remaining))
+
+    def on_rate_limited(self, headers):
+        retry_after = headers.get("retry-after-ms")
+        if retry_after:
+            pause = float(retry_after) / 1000
+        elif headers.get("retry-after"):
+            pause = float(headers.get("retry-after"))
+        else:
+            pause = max(parse_reset(headers.get("x-ratelimit-reset-requests")), parse_reset(headers.get("x-ratelimit-reset-tokens")))
+        pause = pause or DEFAULT_RATE_LIMIT_PAUSE
+        with self._lock:
+            self.rate_limited += 1
+            self.paused_until = max(self.paused_until, time.monotonic() + pause)
+            # Whatever we thought was left was wrong, start refilling from empty
+            self.requests.level = min(self.requests.level, 0.0)
+            self.tokens.level = min(self.tokens.level, 0.0)
+        print(f"Rate limited by the API, pausing requests for {pause:.1f}s")
+
+
+# Shared by every thread of the process, the quota belongs to the API key and not to a single run
+rate_limiter = RateLimiter()
+
+
+def without_sdk_retries(client):
+    # The SDK retries 429s on its own, which would bypass the shared pacing
+    if hasattr(client, "with_options"):
+        return client.with_options(max_retries=0)
+    client.max_retries = 0  # The module level client reads openai.max_retries
+    return client
+
+
+def create_chat_completion(client, **request):
+    # The response cache is consulted first, a hit neither waits for the rate limiter nor costs tokens
+    if not response_cache.enabled:
+        return send_chat_completion(client, **request)
+    key = request_key(request)
+    try:
+        cached = response_cache.get(key)
+    except sqlite3.Error as e:
+        print(f"Response cache unavailable: {str(e)}")
+        return send_chat_completion(client, **request)
+    if cached is not None:
+        # Marked, so its usage and latency are not reported as measured
+        response = ChatCompletion.model_validate_json(cached)
+        response.from_cache = True
+        return response
+    response = send_chat_completion(client, **request)
+    try:
+        response_cache.put(key, response.model_dump_json())
+    except sqlite3.Error as e:
+        print(f"Could not cache response: {str(e)}")
+    return response
+
+
+def send_chat_completion(client, **request):
+    # Sends a chat completion through the shared rate limiter. Rate limits, timeouts, connection
+    # errors and 5xx responses are retried with jittered exponential backoff while the retry
+    # budget lasts, anything else is raised right away.
+    client = without_sdk_retries(client)
+    tokens = estimate_request_tokens(request["messages"], request.get("max_tokens"))
+    retry_budget.record_request()
+    attempt = 0
+    while True:
+        attempt += 1
+        rate_limiter.acquire(tokens)
+        try:
+            raw_response = client.chat.completions.with_raw_response.create(**request)
+        except Exception as e:
+            error_kind = classify_error(e)
+            if error_kind == "rate_limit":
+                rate_limiter.on_rate_limited(e.response.headers)
+            if error_kind not in ("rate_limit", "transient") or attempt >= OPENAI_MAX_ATTEMPTS:
+                raise
+            if not retry_budget.withdraw():
+                print("Retry budget exhausted, not retrying")
+                raise
+            delay = backoff_delay(attempt)
+            print(f"Request failed ({error_kind}: {str(e)}), attempt {attempt + 1} in {delay:.1f}s")
+            time.sleep(delay)
+            continue
+        rate_limiter.update_from_headers(raw_response.headers)
+        return raw_response.parse()
@@ -0,0 +1,66 @@
+import os
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Number of API requests allowed in flight at the same time
+OPENAI_MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", 4))
+# Threads reading and encoding upcoming images while requests are in flight
+PREPARE_THREADS = 2
+
+
+def ordered_requests(items, prepare, send, max_in_flight=None, prefetch=None):
+    # Runs send(prepare(item)) for every item and yields (item, result) in input order.
+    # prepare (reading and encoding an image) runs on its own threads, so the next payloads are
+    # ready by the time a request slot frees up; at most max_in_flight sends run at once. Results
+    # that finish early wait in the window until everything before them is done, so the caller
+    # sees them in the same order as the input.
+    max_in_flight = max(1, max_in_flight or OPENAI_MAX_CONCURRENCY)
+    prefetch = max_in_flight if prefetch is None else prefetch
+    window = deque()
+    stopped = threading.Event()
+
+    with ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="request") as senders, \
+            ThreadPoolExecutor(max_workers=PREPARE_THREADS, thread_name_prefix="prepare") as preparers:
+
+        def start(item):
+            result = Future()
+
+            def on_prepared(prepared):
+                if stopped.is_set():
+                    result.cancel()
+                    return
+                if prepared.exception() is not None:
+                    result.set_exception(prepared.exception())
+                    return
+                sent = senders.submit(send, prepared.result())
+                sent.add_done_callback(lambda done: copy_result(done, result))
+
+            preparers.submit(prepare, item).add_done_callback(on_prepared)
+            return result
+
+        try:
+            items = iter(items)
+            for item in items:
+                window.append((item, start(item)))
+                if len(window) >= max_in_flight + prefetch:
+                    break
+            while window:
+                item, result = window.popleft()
+                yield item, result.result()
+                for next_item in items:
+                    window.append((next_item, start(next_item)))
+                    break
+        finally:
+            # Do not send anything else when the caller stops early or a request failed
+            stopped.set()
+
+
+def copy_result(source, target):
+    if source.exception() is not None:
+        target.set_exception(source.exception())
+    else:
+        target.set_result(source.result())
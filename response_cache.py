@@ -0,0 +1,101 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Descriptions are cached on disk by a hash of the full request: the images (by the sha256 of their
+# source files and the preprocessing settings, see ImageDataUrl), the prompt, the detail mode, the
+# model and max_tokens. Re-describing an unchanged folder, or frames that repeat across videos,
+# then costs nothing. 0 disables the cache.
+RESPONSE_CACHE_DIR = os.getenv("RESPONSE_CACHE_DIR", ".response_cache")
+RESPONSE_CACHE_MAX_MB = int(os.getenv("RESPONSE_CACHE_MAX_MB", 64))
+
+
+def key_content(part):
+    # Images encoded by this app are keyed by their source, other data URLs by the payload
+    source_key = getattr(part["image_url"]["url"], "source_key", None) if part.get("type") == "image_url" else None
+    return dict(part, image_url=dict(part["image_url"], url=source_key)) if source_key else part
+
+
+def request_key(request):
+    messages = [dict(message, content=[key_content(part) for part in message["content"]]) if isinstance(message.get("content"), list) else message
+                for message in request.get("messages", [])]
+    key_data = json.dumps(dict(request, messages=messages), sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(key_data.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    # SQLite store of chat completion responses, shared by all threads of the process (and by other
+    # processes using the same directory). Least recently used entries are evicted past max_mb.
+    def __init__(self, cache_dir=None, max_mb=None):
+        self.cache_dir = cache_dir or RESPONSE_CACHE_DIR
+        self.max_bytes = (RESPONSE_CACHE_MAX_MB if max_mb is None else max_mb) * 1024 * 1024
+        self.hits = 0
+        self.misses = 0
+        self._connection = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    def _connect(self):
+        if self._connection is None:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            connection = sqlite3.connect(os.path.join(self.cache_dir, "responses.sqlite3"), timeout=30, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, response TEXT NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL)"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+            self._connection = connection
+        return self._connection
+
+    def get(self, key):
+        with self._lock:
+            connection = self._connect()
+            row = connection.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            with connection:
+                connection.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+            return row[0]
+
+    def put(self, key, response):
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                connection.execute(
+                    "INSERT OR REPLACE INTO responses (key, response, size, last_used) VALUES (?, ?, ?, ?)",
+                    (key, response, len(response.encode("utf-8")), time.time()),
+                )
+                self._evict(connection)
+
+    def _evict(self, connection):
+        total_bytes = connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total_bytes <= self.max_bytes:
+            return
+        evicted = 0
+        for key, size in connection.execute("SELECT key, size FROM responses ORDER BY last_used").fetchall():
+            if total_bytes <= self.max_bytes:
+                break
+            connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total_bytes -= size
+            evicted += 1
+        print(f"Evicted {evicted} cached responses")
+
+    def report(self):
+        total = self.hits + self.misses
+        if total:
+            print(f"Response cache (since start): {self.hits} hits, {self.misses} misses ({self.hits / total:.0%} hit rate)")
+
+
+response_cache = ResponseCache()
@@ -0,0 +1,224 @@
+import os
+import csv
+import json
+import importlib.util
+import threading
+from datetime import datetime
+from dotenv import load_dotenv
+from openpyxl import Workbook, load_workbook
+
+load_dotenv()
+
+# Formats descriptions are saved in, comma separated: xlsx, csv, jsonl, parquet (needs pyarrow)
+RESULT_FORMATS = [result_format.strip().lower() for result_format in os.getenv("RESULT_FORMATS", "xlsx,jsonl").split(",") if result_format.strip()]
+PARQUET_ROW_GROUP_SIZE = 1000
+
+# Column order of the saved descriptions. Sequential runs add their request mode and measured cost,
+# "Cached" marks rows answered from the response cache, whose cost was not measured in this run.
+INDEPENDENT_COLUMNS = ["Description", "Image", "Error"]
+SEQUENTIAL_COLUMNS = INDEPENDENT_COLUMNS + ["Request Mode", "Prompt Tokens", "Latency (s)", "Cached"]
+# Spreadsheet headers, the other formats keep the row keys
+COLUMN_HEADERS = {"Image": "Composite Image"}
+
+
+class JsonlResultWriter:
+    def __init__(self, path, columns):
+        self.columns = columns
+        self._file = open(path, "w", encoding="utf-8")
+
+    def write(self, row):
+        self._file.write(json.dumps({column: row.get(column) for column in self.columns}) + "\n")
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class CsvResultWriter:
+    def __init__(self, path, columns):
+        self.columns = columns
+        # utf-8-sig so Excel opens non-ASCII descriptions correctly
+        self._file = open(path, "w", encoding="utf-8-sig", newline="")
+        self._writer = csv.writer(self._file)
+        self._writer.writerow([COLUMN_HEADERS.get(column, column) for column in columns])
+        self._file.flush()
+
+    def write(self, row):
+        self._writer.writerow(["" if row.get(column) is None else row.get(column) for column in self.columns])
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class ParquetResultWriter:
+    # Rows are buffered and written as one row group per PARQUET_ROW_GROUP_SIZE rows
+    def __init__(self, path, columns):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise Exception("Saving descriptions as parquet needs pyarrow (pip install pyarrow)")
+        self._pa = pa
+        self.columns = columns
+        types = {"Prompt Tokens": pa.int64(), "Latency (s)": pa.float64(), "Cached": pa.bool_()}
+        self._schema = pa.schema([(column, types.get(column, pa.string())) for column in columns])
+        self._writer = pq.ParquetWriter(path, self._schema)
+        self._rows = []
+
+    def write(self, row):
+        self._rows.append(row)
+        if len(self._rows) >= PARQUET_ROW_GROUP_SIZE:
+            self._flush()
+
+    def _flush(self):
+        if self._rows:
+            table = self._pa.Table.from_pylist([{column: row.get(column) for column in self.columns} for row in self._rows], schema=self._schema)
+            self._writer.write_table(table)
+            self._rows = []
+
+    def close(self):
+        self._flush()
+        self._writer.close()
+
+
+class XlsxResultWriter:
+    # openpyxl's write-only mode streams rows to a temporary file, so memory does not grow with
+    # the run. The workbook can only be opened once it is saved on close.
+    def __init__(self, path, columns):
+        self.path = path
+        self.columns = columns
+        self._workbook = Workbook(write_only=True)
+        self._sheet = self._workbook.create_sheet()
+        self._sheet.append([COLUMN_HEADERS.get(column, column) for column in columns])
+
+    def write(self, row):
+        self._sheet.append([row.get(column) for column in self.columns])
+
+    def close(self):
+        self._workbook.save(self.path)
+
+
+# Modules a format needs, checked before a run starts rather than on its first row
+RESULT_DEPENDENCIES = {"parquet": "pyarrow", "xlsx": "openpyxl"}
+
+RESULT_WRITERS = {
+    "jsonl": JsonlResultWriter,
+    "csv": CsvResultWriter,
+    "parquet": ParquetResultWriter,
+    "xlsx": XlsxResultWriter,
+}
+
+
+class ResultWriters:
+    # Appends every description row to all configured formats as soon as it is final. Files are
+    # created with the first row, so a run that produces nothing leaves nothing behind. Rows may
+    # come from several threads.
+    def __init__(self, folder, columns, formats=None):
+        self.folder = folder
+        self.columns = columns
+        self.formats = formats or RESULT_FORMATS
+        self.paths = []
+        self.rows = 0
+        self.failed = 0
+        self._writers = None
+        self._lock = threading.Lock()
+        for result_format in self.formats:
+            if result_format not in RESULT_WRITERS:
+                raise Exception(f"Unknown result format: {result_format}")
+            dependency = RESULT_DEPENDENCIES.get(result_format)
+            if dependency and importlib.util.find_spec(dependency) is None:
+                raise Exception(f"Saving descriptions as {result_format} needs {dependency} (pip install {dependency})")
+
+    def _open(self):
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        self._writers = []
+        for result_format in self.formats:
+            path = os.path.join(self.folder, f"descriptions_{timestamp}.{result_format}")
+            self._writers.append(RESULT_WRITERS[result_format](path, self.columns))
+            self.paths.append(path)
+
+    def write(self, row):
+        with self._lock:
+            if self._writers is None:
+                self._open()
+            for writer in self._writers:
+                writer.write(row)
+            self.rows += 1
+            if row.get("Error"):
+                self.failed += 1
+
+    def close(self):
+        with self._lock:
+            for writer in self._writers or []:
+                writer.close()
+            self._writers = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+
+def save_descriptions(folder, descriptions):
+    # For results that arrive all at once (batch import). Optional columns are only written when
+    # some row has them.
+    columns = [column for column in SEQUENTIAL_COLUMNS if column in ("Description", "Image") or any(column in row for row in descriptions)]
+    with ResultWriters(folder, columns) as writers:
+        for row in descriptions:
+            writers.write(row)
+    return writers.paths
+
+
+# Spreadsheet headers back to row keys
+HEADER_COLUMNS = {header: column for column, header in COLUMN_HEADERS.items()}
+
+
+def read_jsonl_rows(path):
+    with open(path, "r", encoding="utf-8") as result_file:
+        for line in result_file:
+            yield json.loads(line)
+
+
+def read_csv_rows(path):
+    with open(path, "r", encoding="utf-8-sig", newline="") as result_file:
+        for row in csv.DictReader(result_file):
+            yield {HEADER_COLUMNS.get(header, header): value or None for header, value in row.items()}
+
+
+def read_xlsx_rows(path):
+    workbook = load_workbook(path, read_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        headers = [HEADER_COLUMNS.get(header, header) for header in next(rows, [])]
+        for values in rows:
+            yield dict(zip(headers, values))
+    finally:
+        workbook.close()
+
+
+def read_parquet_rows(path):
+    import pyarrow.parquet as pq
+    for batch in pq.ParquetFile(path).iter_batches(PARQUET_ROW_GROUP_SIZE):
+        yield from batch.to_pylist()
+
+
+# In the order they are preferred for reading rows back
+RESULT_READERS = {
+    "jsonl": read_jsonl_rows,
+    "csv": read_csv_rows,
+    "xlsx": read_xlsx_rows,
+    "parquet": read_parquet_rows,
+}
+
+
+def read_result_rows(paths):
+    # Streams the rows of a finished run back from one of its saved files, for exports that run
+    # after the descriptions without keeping every row in memory
+    for result_format, reader in RESULT_READERS.items():
+        for path in paths:
+            if path.endswith(f".{result_format}"):
+                yield from reader(path)
+                return
@@ -0,0 +1,69 @@
+import os
+import random
+import threading
+import openai
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Attempts per request, including the first one
+OPENAI_MAX_ATTEMPTS = int(os.getenv("OPENAI_MAX_ATTEMPTS", 5))
+RETRY_BASE_DELAY = 1.0
+RETRY_MAX_DELAY = 60.0
+# Retries across all requests are limited to a share of the requests sent, so an outage does not
+# multiply the load on the API by the number of attempts
+RETRY_BUDGET_RATIO = 0.2
+RETRY_BUDGET_MIN = 10
+RETRY_BUDGET_MAX = 100
+
+
+def classify_error(error):
+    # "rate_limit" and "transient" are worth retrying, "fatal" will fail every other request too
+    # (bad key, no credit), "failed" only concerns this request (e.g. an image the API rejects)
+    if isinstance(error, openai.RateLimitError):
+        return "fatal" if getattr(error, "code", None) == "insufficient_quota" else "rate_limit"
+    if isinstance(error, openai.APIConnectionError):  # Includes timeouts
+        return "transient"
+    if isinstance(error, (openai.AuthenticationError, openai.PermissionDeniedError)):
+        return "fatal"
+    if isinstance(error, openai.APIStatusError):
+        return "transient" if error.status_code >= 500 or error.status_code in (408, 409) else "failed"
+    return "failed"
+
+
+def backoff_delay(attempt):
+    # Exponential backoff with full jitter, so parallel workers do not retry in lockstep
+    return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** (attempt - 1)))
+
+
+class RetryBudget:
+    def __init__(self, ratio=RETRY_BUDGET_RATIO, minimum=RETRY_BUDGET_MIN, maximum=RETRY_BUDGET_MAX):
+        self.ratio = ratio
+        self.maximum = maximum
+        self.balance = float(minimum)
+        self._lock = threading.Lock()
+
+    def record_request(self):
+        with self._lock:
+            self.balance = min(self.maximum, self.balance + self.ratio)
+
+    def withdraw(self):
+        with self._lock:
+            if self.balance < 1:
+                return False
+            self.balance -= 1
+            return True
+
+
+retry_budget = RetryBudget()
+
+
+def failed_row(image, error):
+    # Row for an item that could not be described, the run goes on without it
+    print(f"Description failed for {image}: {str(error)}")
+    return {"Image": image, "Description": "", "Error": str(error)}
+
+
+def not_sent_error(fatal_error):
+    # Error of an item that was not sent because an earlier request failed for good
+    return Exception(f"Not sent, the run stopped after: {str(fatal_error)}")
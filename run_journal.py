@@ -0,0 +1,102 @@
+import os
+import json
+import time
+import threading
+
+JOURNAL_FILENAME = "description_journal.jsonl"
+
+
+def journal_path(screenshots_folder):
+    return os.path.join(screenshots_folder, JOURNAL_FILENAME)
+
+
+def read_journal(path):
+    # Returns the settings of the run and the latest row recorded for every item. A line cut off by
+    # a crash is ignored, everything before it is still valid.
+    settings = None
+    rows = {}
+    with open(path, "r", encoding="utf-8") as journal_file:
+        for line in journal_file:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                print(f"Ignoring incomplete journal line in {path}")
+                continue
+            if entry.get("type") == "run":
+                settings = entry["settings"]
+            elif entry.get("type") == "row":
+                rows[entry["key"]] = entry["row"]
+    if settings is None:
+        raise Exception(f"Not a description journal: {path}")
+    return settings, rows
+
+
+def read_journal_settings(screenshots_folder):
+    path = journal_path(screenshots_folder)
+    if not os.path.exists(path):
+        return None
+    return read_journal(path)[0]
+
+
+def rotate_journal(path):
+    # A new run keeps the journal of the previous one, the only record of the descriptions it paid
+    # for, under a timestamped name next to it
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return None
+    base, extension = os.path.splitext(path)
+    stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(os.path.getmtime(path)))
+    rotated_path = f"{base}.{stamp}{extension}"
+    counter = 1
+    while os.path.exists(rotated_path):
+        counter += 1
+        rotated_path = f"{base}.{stamp}-{counter}{extension}"
+    os.replace(path, rotated_path)
+    print(f"Starting a new run, the previous journal was kept as {rotated_path}")
+    return rotated_path
+
+
+class RunJournal:
+    # Append-only record of a description run. Every finished row is written and fsynced as soon
+    # as it arrives, so a crash or a closed window loses at most the requests still in flight.
+    # Resuming reads the journal back and only items without a successful row are sent again;
+    # items a run did not send after a fatal error are not recorded, so they are sent like any
+    # other missing item. Together with the result files this is the record of a run: the modes
+    # hand every row to their row_callback without keeping it and only return the row count, so
+    # memory stays flat however large the run is.
+    def __init__(self, screenshots_folder, settings, resume=False):
+        self.path = journal_path(screenshots_folder)
+        self.settings = settings
+        self.completed = {}
+        self._lock = threading.Lock()
+        if resume and os.path.exists(self.path):
+            journal_settings, rows = read_journal(self.path)
+            if journal_settings != settings:
+                raise Exception(f"The journal in {screenshots_folder} was written with different settings, start a new run instead")
+            # Failed rows are kept in the journal but their items are tried again
+            self.completed = {key: row for key, row in rows.items() if not row.get("Error")}
+            print(f"Resuming run: {len(self.completed)} items already described")
+            self._file = open(self.path, "a", encoding="utf-8")
+        else:
+            rotate_journal(self.path)
+            self._file = open(self.path, "w", encoding="utf-8")
+            self._append({"type": "run", "settings": settings})
+
+    def _append(self, entry):
+        self._file.write(json.dumps(entry) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def record(self, key, row):
+        with self._lock:
+            self._append({"type": "row", "key": key, "row": row})
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
@@ -0,0 +1,107 @@
+import os
+import json
+import time
+import hashlib
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Scene lists and per-frame metrics are cached on disk, keyed by a fingerprint of the video file
+# plus the detector settings. The directory can be shared between machines (e.g. a scratch volume),
+# entries are written atomically and the least recently used ones are evicted past the size limit.
+SCENE_CACHE_DIR = os.getenv("SCENE_CACHE_DIR", ".scene_cache")
+SCENE_CACHE_MAX_MB = int(os.getenv("SCENE_CACHE_MAX_MB", 512))
+
+FINGERPRINT_SAMPLES = 16
+FINGERPRINT_SAMPLE_SIZE = 64 * 1024
+
+
+def video_fingerprint(video_path):
+    # Hashing a multi-gigabyte video would take longer than the detection we want to skip, so only
+    # the file size and a fixed number of evenly spaced blocks (including head and tail) are hashed.
+    file_size = os.path.getsize(video_path)
+    digest = hashlib.blake2b(str(file_size).encode("utf-8"), digest_size=20)
+    with open(video_path, "rb") as video_file:
+        if file_size <= FINGERPRINT_SAMPLES * FINGERPRINT_SAMPLE_SIZE:
+            digest.update(video_file.read())
+        else:
+            last_offset = file_size - FINGERPRINT_SAMPLE_SIZE
+            for i in range(FINGERPRINT_SAMPLES):
+                video_file.seek(last_offset * i // (FINGERPRINT_SAMPLES - 1))
+                digest.update(video_file.read(FINGERPRINT_SAMPLE_SIZE))
+    return digest.hexdigest()
+
+
+def cache_key(video_path, detection_params):
+    key_data = json.dumps({"video": video_fingerprint(video_path), "params": detection_params}, sort_keys=True)
+    return hashlib.sha256(key_data.encode("utf-8")).hexdigest()
+
+
+def entry_path(key, cache_dir=None):
+    return os.path.join(cache_dir or SCENE_CACHE_DIR, f"{key}.json")
+
+
+def load_entry(key, cache_dir=None):
+    path = entry_path(key, cache_dir)
+    try:
+        with open(path, "r", encoding="utf-8") as entry_file:
+            entry = json.load(entry_file)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        print(f"Ignoring unreadable scene cache entry {path}: {str(e)}")
+        return None
+    # Bump the modification time so eviction sees this entry as recently used
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    return entry
+
+
+def save_entry(key, entry, cache_dir=None, max_mb=None):
+    cache_dir = cache_dir or SCENE_CACHE_DIR
+    os.makedirs(cache_dir, exist_ok=True)
+    path = entry_path(key, cache_dir)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as entry_file:
+        json.dump(entry, entry_file, separators=(",", ":"))
+    os.replace(temp_path, path)
+    evict(cache_dir, SCENE_CACHE_MAX_MB if max_mb is None else max_mb)
+
+
+def evict(cache_dir, max_mb):
+    max_bytes = max_mb * 1024 * 1024
+    entries = []
+    for dir_entry in os.scandir(cache_dir):
+        if not dir_entry.name.endswith(".json"):
+            continue
+        try:
+            stat = dir_entry.stat()
+        except FileNotFoundError:
+            continue  # Removed by another process sharing the cache
+        entries.append((stat.st_mtime, stat.st_size, dir_entry.path))
+
+    total_bytes = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total_bytes <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            print(f"Evicted scene cache entry: {path}")
+        except FileNotFoundError:
+            pass
+        total_bytes -= size
+
+
+def make_entry(video_path, fps, num_frames, scenes, metrics=None, keyframes=None):
+    # keyframes lists the frame saved for each scene when it is not the first frame of the scene
+    return {
+        "video": os.path.basename(video_path),
+        "created": time.time(),
+        "fps": fps,
+        "num_frames": num_frames,
+        "scenes": [list(scene) for scene in scenes],
+        "keyframes": keyframes,
+        "metrics": metrics,
+    }
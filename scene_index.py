@@ -0,0 +1,150 @@
+import os
+import json
+import threading
+from manifest import format_timecode
+
+# Written next to the keyframes of every processed video: the scenes with their frame ranges,
+# times and keyframe file, so descriptions can be placed on the video timeline without opening it
+SCENE_INDEX_FILENAME = "scene_index.json"
+CHAPTER_TITLE_LENGTH = 80
+
+
+def scene_index_path(folder):
+    return os.path.join(folder, SCENE_INDEX_FILENAME)
+
+
+def build_scene_index(video_path, fps, num_frames, scenes, keyframes=None):
+    # keyframes gives the frame saved for each scene when it is not the first one (frame selection)
+    if not keyframes or len(keyframes) != len(scenes):
+        keyframes = [start_frame for start_frame, _ in scenes]
+    return {
+        "video": os.path.abspath(video_path) if os.path.exists(video_path) else video_path,
+        "fps": fps,
+        "num_frames": num_frames,
+        "scenes": [
+            {
+                "keyframe": f"keyframe_{keyframe:06d}.jpg",
+                "start_frame": start_frame,
+                "end_frame": end_frame,
+                "start": round(start_frame / fps, 3),
+                "end": round(end_frame / fps, 3),
+                "start_timecode": format_timecode(start_frame / fps),
+                "end_timecode": format_timecode(end_frame / fps),
+            }
+            for (start_frame, end_frame), keyframe in zip(scenes, keyframes)
+        ],
+    }
+
+
+def save_scene_index(folder, video_path, fps, num_frames, scenes, keyframes=None):
+    if not fps or fps <= 0:
+        print("Frame rate unknown, no scene index saved")
+        return None
+    index = build_scene_index(video_path, fps, num_frames, scenes, keyframes)
+    path = scene_index_path(folder)
+    with open(path + ".tmp", "w", encoding="utf-8") as index_file:
+        json.dump(index, index_file, indent=1)
+    os.replace(path + ".tmp", path)
+    print(f"Scene index saved: {len(scenes)} scenes at {fps:g} fps")
+    return path
+
+
+def load_scene_index(folder):
+    path = scene_index_path(folder)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as index_file:
+        return json.load(index_file)
+
+
+def srt_time(seconds):
+    return format_timecode(seconds).replace(".", ",")
+
+
+def chapter_title(description):
+    title = " ".join(description.split())
+    if len(title) > CHAPTER_TITLE_LENGTH:
+        title = title[:CHAPTER_TITLE_LENGTH - 3].rstrip() + "..."
+    # ffmetadata escapes these with a backslash
+    for character in "\\=;#":
+        title = title.replace(character, "\\" + character)
+    return title
+
+
+def description_span(scenes, row):
+    # (start, end) in seconds of the scenes a row describes, None if it has no description or
+    # names no keyframe of the index. The Image of a sequence lists its keyframes, it covers the
+    # scenes from the first to the last one.
+    if row.get("Error") or not row.get("Description"):
+        return None
+    members = [scenes[name.strip()] for name in row["Image"].split(",") if name.strip() in scenes]
+    if not members:
+        return None
+    return min(scene["start"] for scene in members), max(scene["end"] for scene in members)
+
+
+class TimedDescriptionWriter:
+    # Writes the descriptions of a keyframe folder as SRT and WebVTT subtitles and an ffmetadata
+    # chapter file (ffmpeg -i video -i chapters.txt -map_metadata 1) while the rows arrive in frame
+    # order. Overlapping sequences give overlapping cues, their chapters start where the previous
+    # one ended. The files are created with the first row that matches a scene, folders without a
+    # scene index or runs without a match leave nothing behind.
+    def __init__(self, folder, output_name=None):
+        self.folder = folder
+        index = load_scene_index(folder)
+        self.scenes = {scene["keyframe"]: scene for scene in index["scenes"]} if index else {}
+        self.output_name = output_name or (os.path.splitext(os.path.basename(index["video"]))[0] if index else "") or "descriptions"
+        self.paths = []
+        self.cues = 0
+        self._files = None
+        self._chapter_end = 0.0
+        self._lock = threading.Lock()
+
+    def _open(self):
+        self.paths = [os.path.join(self.folder, f"{self.output_name}{suffix}") for suffix in (".srt", ".vtt", ".chapters.txt")]
+        self._files = [open(path, "w", encoding="utf-8") for path in self.paths]
+        self._files[1].write("WEBVTT\n\n")
+        self._files[2].write(";FFMETADATA1\n")
+
+    def write(self, row):
+        span = description_span(self.scenes, row)
+        if span is None:
+            return
+        start, end = span
+        # A blank line would end the cue early
+        text = "\n".join(line for line in row["Description"].splitlines() if line.strip())
+        with self._lock:
+            if self._files is None:
+                self._open()
+            srt, vtt, chapters = self._files
+            self.cues += 1
+            srt.write(f"{self.cues}\n{srt_time(start)} --> {srt_time(end)}\n{text}\n\n")
+            vtt.write(f"{self.cues}\n{format_timecode(start)} --> {format_timecode(end)}\n{text}\n\n")
+            chapter_start = max(start, self._chapter_end)
+            if chapter_start < end:
+                chapters.write(f"\n[CHAPTER]\nTIMEBASE=1/1000\nSTART={round(chapter_start * 1000)}\nEND={round(end * 1000)}\ntitle={chapter_title(text)}\n")
+                self._chapter_end = end
+
+    def close(self):
+        with self._lock:
+            for timed_file in self._files or []:
+                timed_file.close()
+            self._files = []
+        if self.cues:
+            print(f"Exported {self.cues} timed descriptions to {', '.join(self.paths)}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+
+def export_timed_descriptions(folder, descriptions, output_name=None):
+    # For descriptions that are all known already. Returns the paths of the written files, an
+    # empty list when the folder has no scene index or no description matches a scene.
+    with TimedDescriptionWriter(folder, output_name) as writer:
+        for row in descriptions:
+            writer.write(row)
+    return writer.paths
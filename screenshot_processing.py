@@ -6,6 +6,7 @@ from dotenv import load_dotenv
 from PIL import Image
 from PyQt5.QtWidgets import QMessageBox, QApplication, QDialog, QVBoxLayout, QLabel, QPushButton, QHBoxLayout
 from PyQt5.QtCore import Qt
+from manifest import list_images
 
 load_dotenv()
 
@@ -24,7 +25,7 @@ def process_screenshots(screenshots_folder, prompt, image_treatment_mode, sequen
             print("Invalid value for OPENAI_MAX_TOKENS. Using default value of 100.")
             max_tokens = 100
 
-    image_files = [f for f in os.listdir(screenshots_folder) if f.endswith(".jpg") or f.endswith(".png")]
+    image_files = list_images(screenshots_folder)
     descriptions = []
 
     if image_treatment_mode == "Independent":
@@ -0,0 +1,57 @@
+import numpy as np
+from scenedetect import open_video, ContentDetector
+import scene_cache
+from scene_index import save_scene_index
+from video_processing import (
+    create_scene_manager,
+    cuts_for_thresholds,
+    extract_keyframes,
+    frame_metrics,
+    get_video_info,
+    metrics_params,
+    scenes_from_cuts,
+)
+
+
+def compute_frame_scores(video_path, downscale=0, use_cache=True):
+    # ContentDetector scores do not depend on the threshold, so one decode serves every sensitivity.
+    key = scene_cache.cache_key(video_path, metrics_params(downscale)) if use_cache else None
+    if use_cache:
+        entry = scene_cache.load_entry(key)
+        if entry is not None and entry.get("metrics"):
+            print("Frame scores loaded from scene cache")
+            return np.array(entry["metrics"][ContentDetector.FRAME_SCORE_KEY], dtype=float)
+
+    print("Computing frame scores...")
+    # Only the scores are used, the threshold of the detector itself does not matter
+    scene_manager, _ = create_scene_manager(255.0, downscale, collect_metrics=True)
+    video = open_video(video_path)
+    scene_manager.detect_scenes(video=video)
+    scores = frame_metrics(scene_manager.stats_manager, 0, video.frame_number)
+
+    if use_cache:
+        fps, num_frames = get_video_info(video_path)
+        metrics = {ContentDetector.FRAME_SCORE_KEY: scores}
+        scene_cache.save_entry(key, scene_cache.make_entry(video_path, fps, num_frames, [], metrics))
+    return np.array(scores, dtype=float)
+
+
+def sweep_sensitivity(video_path, thresholds, downscale=0, use_cache=True):
+    scores = compute_frame_scores(video_path, downscale, use_cache)
+    cuts = cuts_for_thresholds(scores, thresholds)
+    scene_counts = {threshold: len(threshold_cuts) + 1 if threshold_cuts else 0 for threshold, threshold_cuts in cuts.items()}
+    print("Sensitivity sweep results:")
+    for threshold, count in scene_counts.items():
+        print(f"Sensitivity {threshold:g}: {count} scenes")
+    return scene_counts
+
+
+def extract_keyframes_for_sensitivity(video_path, output_folder, sensitivity, downscale=0, use_cache=True):
+    scores = compute_frame_scores(video_path, downscale, use_cache)
+    cuts = cuts_for_thresholds(scores, [sensitivity])[float(sensitivity)]
+    scenes = scenes_from_cuts(cuts, len(scores))
+    print(f"Extracting {len(scenes)} keyframes for sensitivity {sensitivity}")
+    extract_keyframes(video_path, output_folder, scenes, skip_existing=True)
+    fps, num_frames = get_video_info(video_path)
+    save_scene_index(output_folder, video_path, fps, num_frames, scenes)
+    return output_folder
@@ -1,15 +1,42 @@
 import os
+import time
 import base64
 import openai
-from utils import generate_description_sequential, create_composite_image, generate_sequences, confirm_sequences
+from utils import build_sequence_messages, request_completion, generate_sequences, confirm_sequences
+from retries import classify_error, failed_row, not_sent_error
+from response_cache import response_cache
+from image_preprocessing import UploadStats
+from run_journal import RunJournal
+from manifest import image_entries
 
-def process_screenshots_sequential(screenshots_folder, prompt, sequence_length, overlap, detail_mode, progress_callback=None):
+def process_screenshots_sequential(screenshots_folder, prompt, sequence_length, overlap, detail_mode, progress_callback=None, resume=False, sequence_request="Multiple Images", row_callback=None, confirm=True):
     openai.api_key = os.getenv("OPENAI_API_KEY")
     model = os.getenv("OPENAI_MODEL")
     max_tokens = int(os.getenv("OPENAI_MAX_TOKENS", 100))
 
-    image_files = [f for f in os.listdir(screenshots_folder) if f.endswith(".jpg") or f.endswith(".png")]
+    images = image_entries(screenshots_folder)
+    image_files = list(images)
+    # Only kept without a row_callback, see RunJournal
     descriptions = []
+    row_count = 0
+    # Measured cost of the sequences sent in this run
+    measured = 0
+    total_prompt_tokens = 0
+    total_latency = 0.0
+    upload_stats = UploadStats()
+
+    def emit(row):
+        nonlocal row_count, measured, total_prompt_tokens, total_latency
+        row_count += 1
+        # Cached responses cost nothing, their usage is the one of the request that was cached
+        if row.get("Prompt Tokens") is not None and not row.get("Cached"):
+            measured += 1
+            total_prompt_tokens += row["Prompt Tokens"]
+            total_latency += row["Latency (s)"]
+        if row_callback:
+            row_callback(row)
+        else:
+            descriptions.append(row)
 
     sequences = generate_sequences(image_files, sequence_length, overlap)
     
@@ -19,26 +46,79 @@ def process_screenshots_sequential(screenshots_folder, prompt, sequence_length,
     print(f"Prompt: {prompt}")
     print(f"Detail Mode: {detail_mode}")
     print(f"Number of Sequences: {len(sequences)}")
+    print(f"Sequence Request: {sequence_request}")
     print("Messages: ")
 
     print("Generated sequences:")
     for i, sequence in enumerate(sequences, start=1):
         print(f"Sequence {i}: {', '.join(sequence)}")
 
-    confirmed = confirm_sequences(sequences)
+    # Scripted runs (load_test.py) have no window to confirm in
+    confirmed = confirm_sequences(sequences) if confirm else True
 
     if confirmed:
         print("Sequences approved. Sending to AI...")
-        for i, sequence in enumerate(sequences, start=1):
-            sequence_paths = [os.path.join(screenshots_folder, image_file) for image_file in sequence]
-            composite_image_path = create_composite_image(sequence_paths)
-            description = generate_description_sequential(openai, model, max_tokens, sequence_paths, prompt, detail_mode)
-            descriptions.append({"Image": composite_image_path, "Description": description})
-            if progress_callback:
-                progress_callback(i, len(sequences))
+        # Resuming skips the sequences already described
+        settings = {"mode": "Consequent", "prompt": prompt, "detail_mode": detail_mode, "sequence_length": sequence_length, "overlap": overlap, "model": model, "max_tokens": max_tokens}
+        if sequence_request != "Multiple Images":
+            settings["sequence_request"] = sequence_request
+        fatal_errors = []
+        with RunJournal(screenshots_folder, settings, resume) as journal:
+            for i, sequence in enumerate(sequences, start=1):
+                sequence_key = ", ".join(sequence)
+                # The Image column lists the keyframes of the sequence, like batch results do
+                sequence_images = ",".join(sequence)
+                if sequence_key in journal.completed:
+                    # Journals of older runs name a composite image instead
+                    row = dict(journal.completed[sequence_key], Image=sequence_images)
+                    emit(row)
+                    if progress_callback:
+                        progress_callback(i, len(sequences))
+                    continue
+                sequence_paths = [os.path.join(screenshots_folder, image_file) for image_file in sequence]
+                if fatal_errors:
+                    row = {"Image": sequence_images, "Description": "", "Error": str(not_sent_error(fatal_errors[0]))}
+                    emit(row)
+                    if progress_callback:
+                        progress_callback(i, len(sequences))
+                    continue
+                try:
+                    messages = build_sequence_messages(sequence_paths, prompt, detail_mode, sequence_request, upload_stats, [images[image_file] for image_file in sequence])
+                    started = time.monotonic()
+                    response = request_completion(openai, model, max_tokens, messages)
+                    latency = time.monotonic() - started
+                except Exception as e:
+                    # Keep the descriptions already paid for. After an error that affects every
+                    # request, the remaining sequences are not sent.
+                    if classify_error(e) == "fatal":
+                        fatal_errors.append(e)
+                    row = failed_row(sequence_images, e)
+                else:
+                    # The request mode and its measured cost are kept with every row, to compare
+                    # mosaics against multi-image requests
+                    row = {
+                        "Image": sequence_images,
+                        "Description": response.choices[0].message.content.strip(),
+                        "Request Mode": sequence_request,
+                        "Prompt Tokens": response.usage.prompt_tokens if response.usage else None,
+                        "Latency (s)": round(latency, 2),
+                        "Cached": getattr(response, "from_cache", False),
+                    }
+                journal.record(sequence_key, row)
+                emit(row)
+                if progress_callback:
+                    progress_callback(i, len(sequences))
+        response_cache.report()
+        upload_stats.report()
+        if measured:
+            prompt_tokens = total_prompt_tokens / measured
+            latency = total_latency / measured
+            print(f"{sequence_request} requests: {prompt_tokens:.0f} prompt tokens and {latency:.2f}s per sequence on average")
+        if fatal_errors:
+            print(f"Run stopped, no more requests were sent after: {str(fatal_errors[0])}")
         print("Sequences processed.")
     else:
         print("Sequences not approved. Aborting.")
-        return []
+        return [] if row_callback is None else 0
 
-    return descriptions
+    return descriptions if row_callback is None else row_count
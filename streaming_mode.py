@@ -0,0 +1,145 @@
+import os
+import time
+import cv2
+from dotenv import load_dotenv
+from scenedetect import VideoCaptureAdapter
+from pipeline import DescriptionPipeline
+from video_processing import FullResolutionTap, TAP_HEADROOM_FRAMES, create_scene_manager, frame_number, save_keyframe
+from manifest import folder_manifests
+from scene_index import save_scene_index
+
+load_dotenv()
+
+# A followed file that has not grown for this many seconds is considered finished
+STREAM_IDLE_TIMEOUT = float(os.getenv("STREAM_IDLE_TIMEOUT", 10))
+STREAM_POLL_INTERVAL = 0.5
+# Devices often do not report a frame rate, timecodes then assume this one
+DEFAULT_STREAM_FPS = 30.0
+
+
+class LiveCapture:
+    # The part of the cv2.VideoCapture interface VideoCaptureAdapter uses, for sources without a
+    # known length: devices, pipes, network streams and files that are still being recorded.
+    # With follow=True, reaching the end of the file waits for it to grow instead of ending the
+    # stream. Setting stop_event ends the stream at the next frame.
+    def __init__(self, source, follow=False, stop_event=None, idle_timeout=STREAM_IDLE_TIMEOUT):
+        self.source = source
+        self.follow = follow
+        self.stop_event = stop_event
+        self.idle_timeout = idle_timeout
+        self._frames_read = 0
+        self._cap = cv2.VideoCapture(source)
+        # A file that was just created may not have a readable header yet
+        idle_since = time.monotonic()
+        while follow and not self._cap.isOpened() and not self._stopped():
+            if time.monotonic() - idle_since > idle_timeout:
+                break
+            time.sleep(STREAM_POLL_INTERVAL)
+            self._cap = cv2.VideoCapture(source)
+
+    def _stopped(self):
+        return self.stop_event is not None and self.stop_event.is_set()
+
+    def isOpened(self):
+        return self._cap.isOpened()
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FRAME_COUNT:
+            return 0  # Unknown, makes VideoCaptureAdapter treat the stream as non-terminating
+        return self._cap.get(prop)
+
+    def grab(self):
+        idle_since = time.monotonic()
+        while not self._stopped():
+            if self._cap.grab():
+                self._frames_read += 1
+                return True
+            if not self.follow or time.monotonic() - idle_since > self.idle_timeout:
+                return False
+            time.sleep(STREAM_POLL_INTERVAL)
+            self._reopen()
+        return False
+
+    def _reopen(self):
+        # The decoder does not notice appended data, reopen and continue after the last frame read
+        self._cap.release()
+        self._cap = cv2.VideoCapture(self.source)
+        self._cap.set(cv2.CAP_PROP_POS_FRAMES, self._frames_read)
+        if self._cap.get(cv2.CAP_PROP_POS_FRAMES) != self._frames_read:
+            # Files without an index (e.g. Matroska before it is finalized) cannot seek,
+            # skip the frames that were already processed instead
+            self._cap.release()
+            self._cap = cv2.VideoCapture(self.source)
+            for _ in range(self._frames_read):
+                if not self._cap.grab():
+                    break
+
+    def retrieve(self):
+        return self._cap.retrieve()
+
+    def release(self):
+        self._cap.release()
+
+
+def open_stream(source, stop_event=None):
+    # A number selects a capture device, an existing file is followed while it grows,
+    # anything else (URL, pipe) is handed to OpenCV as is
+    if isinstance(source, int) or source.isdigit():
+        capture = LiveCapture(int(source), stop_event=stop_event)
+        name = f"device{source}"
+    else:
+        capture = LiveCapture(source, follow=os.path.isfile(source), stop_event=stop_event)
+        name = os.path.basename(source.rstrip("/")) or "stream"
+    if not capture.isOpened():
+        raise Exception(f"Could not open stream: {source}")
+    frame_rate = capture.get(cv2.CAP_PROP_FPS)
+    video = VideoCaptureAdapter(capture, frame_rate=frame_rate if frame_rate >= 1 else DEFAULT_STREAM_FPS)
+    return video, name
+
+
+def process_stream(source, output_folder, sensitivity, prompt, detail_mode, description_callback=None, downscale=0, stop_event=None):
+    # Keyframes are written as soon as a cut is detected and handed straight to the description
+    # workers, so text for a scene arrives one API round-trip after its cut instead of after the
+    # whole video was processed.
+    print(f"Opening stream: {source}")
+    video, _ = open_stream(source, stop_event)
+    print(f"Frame rate: {float(video.frame_rate):g}")
+    folder_manifests.set_source(output_folder, str(source), float(video.frame_rate))
+    print(f"Sensitivity: {sensitivity}")
+    print(f"Detail Mode: {detail_mode}")
+
+    scene_manager, detector = create_scene_manager(sensitivity, downscale)
+    tap = FullResolutionTap(video, TAP_HEADROOM_FRAMES + getattr(detector, "event_buffer_length", 0))
+    describer = DescriptionPipeline(prompt, detail_mode, description_callback=description_callback)
+
+    keyframes = []
+
+    def emit_keyframe(frame_num, frame):
+        keyframes.append(frame_num)
+        save_keyframe(output_folder, frame_num, frame)
+        describer.submit(os.path.join(output_folder, f"keyframe_{frame_num:06d}.jpg"))
+
+    def on_new_scene(frame_img, position):
+        # The opening scene only becomes a scene once the first cut is seen
+        if not describer.submitted and tap.first_frame is not None:
+            emit_keyframe(*tap.first_frame)
+        frame_num = frame_number(position)
+        frame = tap.get_frame(frame_num)
+        emit_keyframe(frame_num, frame if frame is not None else frame_img)
+
+    try:
+        print("Detecting scenes in stream...")
+        scene_manager.detect_scenes(video=tap, callback=on_new_scene)
+        # A stream without any cut still shows one scene
+        if not describer.submitted and tap.first_frame is not None:
+            emit_keyframe(*tap.first_frame)
+    finally:
+        video.capture.release()
+        print(f"Stream ended after {video.frame_number} frames, waiting for {describer.submitted} descriptions")
+        # Every scene lasts until the next cut, the last one until the end of the stream
+        scenes = list(zip(keyframes, keyframes[1:] + [video.frame_number]))
+        save_scene_index(output_folder, str(source), float(video.frame_rate), video.frame_number, scenes)
+        descriptions = describer.close()
+
+    print("Stream processing completed.")
+    return descriptions
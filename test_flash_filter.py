@@ -0,0 +1,70 @@
+"""Flash filter replay tests
+
+The sensitivity sweep and the parallel detection decide their cuts with
+`video_processing.cuts_for_thresholds`, which replays scenedetect's FlashFilter over the frame
+scores instead of running it. These tests feed random score series to the real FlashFilter and
+to the replay, so a scenedetect upgrade that changes the filter fails here instead of silently
+changing the scene cuts.
+"""
+
+import inspect
+
+import numpy as np
+import pytest
+from scenedetect import FrameTimecode
+
+try:
+    from scenedetect.detector import FlashFilter
+except ImportError:
+    from scenedetect.scene_detector import FlashFilter
+
+from video_processing import cuts_for_thresholds
+
+FPS = 30.0
+
+
+def flash_filter_cuts(scores, threshold, min_scene_len, merge):
+    """Cuts of the real FlashFilter, fed like ContentDetector does: skipped frames (NaN) are not
+    passed on, the first frame counts as a score of 0."""
+    mode = FlashFilter.Mode.MERGE if merge else FlashFilter.Mode.SUPPRESS
+    flash_filter = FlashFilter(mode=mode, length=min_scene_len)
+    # Older versions take frame numbers, newer ones timecodes
+    takes_timecodes = "timecode" in inspect.signature(flash_filter.filter).parameters
+    cuts = []
+    for frame_num, score in enumerate(scores):
+        if frame_num == 0:
+            score = np.nan_to_num(score, nan=0.0)
+        elif np.isnan(score):
+            continue
+        position = FrameTimecode(frame_num, fps=FPS) if takes_timecodes else frame_num
+        for cut in flash_filter.filter(position, score >= threshold):
+            cuts.append(getattr(cut, "frame_num", cut))
+    return cuts
+
+
+def random_scores(rng):
+    """Mostly low scores with a few flashes, and every other series with skipped frames."""
+    num_frames = int(rng.integers(1, 300))
+    scores = rng.gamma(2, 4, size=num_frames)
+    scores[rng.integers(0, num_frames, int(rng.integers(0, 30)))] += rng.uniform(10, 80)
+    stride = int(rng.integers(1, 4))
+    if stride > 1:
+        # Frame skip: only every stride-th frame is scored
+        skipped = np.ones(num_frames, dtype=bool)
+        skipped[::stride] = False
+        scores[skipped] = np.nan
+    return scores
+
+
+@pytest.mark.parametrize("merge", [True, False], ids=["merge", "suppress"])
+def test_cuts_match_flash_filter(merge: bool):
+    """The replay makes the same cuts as the real FlashFilter for every threshold."""
+    rng = np.random.default_rng(5)
+    for _ in range(300):
+        scores = random_scores(rng)
+        min_scene_len = int(rng.integers(0, 20))
+        thresholds = rng.uniform(0, 60, 5).tolist()
+        replayed = cuts_for_thresholds(scores.copy(), thresholds, min_scene_len, merge)
+        for threshold in thresholds:
+            expected = flash_filter_cuts(scores, threshold, min_scene_len, merge)
+            assert replayed[float(threshold)] == expected, (scores.tolist(), threshold, min_scene_len)
@@ -1,15 +1,27 @@
 import os
+import numpy as np
 from datetime import datetime
-from PIL import Image
 from PyQt5.QtWidgets import QApplication, QMessageBox
 from PyQt5.QtCore import QTimer, QEventLoop
+from rate_limiter import create_chat_completion, image_token_costs
+from image_preprocessing import image_data_url
+from mosaic import encode_mosaic, mosaic_size
+from manifest import image_sizes
 
 
-def create_output_folder(video_path):
+def create_output_folder(video_path, parent_folder=None):
     video_name = os.path.splitext(os.path.basename(video_path))[0]
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     output_folder = f"{video_name}_{timestamp}"
-    os.makedirs(output_folder, exist_ok=True)
+    if parent_folder:
+        output_folder = os.path.join(parent_folder, output_folder)
+    # Videos with the same name (e.g. from different directories) must not share a folder
+    base_folder = output_folder
+    suffix = 1
+    while os.path.exists(output_folder):
+        suffix += 1
+        output_folder = f"{base_folder}_{suffix}"
+    os.makedirs(output_folder)
     return output_folder
 
 
@@ -19,61 +31,32 @@ def calculate_progress(current, total):
     return (current / total) * 100
 
 
-def calculate_token_cost(screenshots_folder, detail_mode, image_treatment_mode, sequence_length, overlap):
+def request_token_costs(image_sizes, detail_mode, image_treatment_mode, sequence_length, overlap, sequence_request="Multiple Images"):
+    # Image tokens of every request a run would send, for images of the given (n, 2) sizes in
+    # processing order. Sequences are the ones generate_sequences makes, the trailing partial
+    # sequences included.
+    if len(image_sizes) == 0:
+        return np.zeros(0, dtype=np.int64)
+    if image_treatment_mode == "Independent":
+        return image_token_costs(image_sizes[:, 0], image_sizes[:, 1], detail_mode)
+    sequence_length = max(1, sequence_length)  # Ensure sequence_length is at least 1
+    overlap = min(overlap, sequence_length - 1)  # Ensure overlap is less than sequence_length
+    starts = np.arange(0, len(image_sizes), sequence_length - overlap)
+    ends = np.minimum(starts + sequence_length, len(image_sizes))
+    if sequence_request == "Mosaic":
+        mosaic_sizes = np.array([mosaic_size(image_sizes[start:end].tolist(), detail_mode) for start, end in zip(starts, ends)])
+        return image_token_costs(mosaic_sizes[:, 0], mosaic_sizes[:, 1], detail_mode)
+    cumulative_costs = np.concatenate(([0], np.cumsum(image_token_costs(image_sizes[:, 0], image_sizes[:, 1], detail_mode))))
+    return cumulative_costs[ends] - cumulative_costs[starts]
+
+
+def calculate_token_cost(screenshots_folder, detail_mode, image_treatment_mode, sequence_length, overlap, sequence_request="Multiple Images"):
     if not screenshots_folder:
         return 0
-
-    image_files = [f for f in os.listdir(screenshots_folder) if f.endswith(".jpg") or f.endswith(".png")]
-    total_cost = 0
-
-    if image_treatment_mode == "Independent":
-        for image_file in image_files:
-            image_path = os.path.join(screenshots_folder, image_file)
-            with Image.open(image_path) as img:
-                width, height = img.size
-            if detail_mode == "Low":
-                total_cost += 85
-            else:
-                scaled_width = min(width, 2048)
-                scaled_height = min(height, 2048)
-                aspect_ratio = width / height
-                if width > height:
-                    scaled_height = int(scaled_width / aspect_ratio)
-                else:
-                    scaled_width = int(scaled_height * aspect_ratio)
-                num_tiles = (scaled_width // 512) * (scaled_height // 512)
-                total_cost += 170 * num_tiles + 85
-    else:
-        sequence_length = max(1, sequence_length)  # Ensure sequence_length is at least 1
-        overlap = min(overlap, sequence_length - 1)  # Ensure overlap is less than sequence_length
-        num_messages = (len(image_files) - sequence_length) // (sequence_length - overlap) + 1
-        for _ in range(num_messages):
-            if detail_mode == "Low":
-                total_cost += 85 * sequence_length
-            else:
-                total_cost += (170 * sequence_length + 85) * 4  # Assuming 4 tiles per image in high detail mode
-
-    return total_cost
-
-
-def create_composite_image(image_paths):
-    images = [Image.open(image_path) for image_path in image_paths]
-    widths, heights = zip(*(i.size for i in images))
-
-    max_width = max(widths)
-    total_height = sum(heights)
-
-    composite_image = Image.new("RGB", (max_width, total_height))
-
-    y_offset = 0
-    for image in images:
-        composite_image.paste(image, (0, y_offset))
-        y_offset += image.size[1]
-
-    composite_image_path = "composite_image.jpg"
-    composite_image.save(composite_image_path)
-
-    return composite_image_path
+    # Sizes come from the folder manifest, only new or changed images are opened
+    _, sizes = image_sizes(screenshots_folder)
+    costs = request_token_costs(sizes, detail_mode, image_treatment_mode, sequence_length, overlap, sequence_request)
+    return int(costs.sum())
 
 
 def generate_sequences(image_files, sequence_length, overlap):
@@ -95,70 +78,74 @@ def generate_sequences(image_files, sequence_length, overlap):
     return sequences
 
 
-def generate_description_independent(client, model, max_tokens, image_path, prompt, detail_mode):
-    with open(image_path, "rb") as image_file:
-        image_data = image_file.read()
-        image_base64 = base64.b64encode(image_data).decode("utf-8")
+def encode_image(image_path, detail_mode, upload_stats=None):
+    # Data URL of the image as it is uploaded: resized for the detail mode and re-encoded. Encoded
+    # images are kept in memory, see PayloadCache. The savings are counted in the run's upload_stats.
+    return image_data_url(image_path, detail_mode, upload_stats)
 
-    messages = [
-        {
-            "role": "user",
-            "content": [
-                {"type": "text", "text": prompt},
-                {
-                    "type": "image_url",
-                    "image_url": {
-                        "url": f"data:image/jpeg;base64,{image_base64}",
-                        "detail": detail_mode.lower()
-                    },
-                },
-            ],
-        },
-    ]
 
-    response = client.chat.completions.create(
-        model=model,
-        messages=messages,
-        max_tokens=max_tokens,
-    )
-
-    description = response.choices[0].message.content.strip()
-    return description
+def image_content(image_url, detail_mode):
+    return {
+        "type": "image_url",
+        "image_url": {
+            "url": image_url,
+            "detail": detail_mode.lower()
+        },
+    }
 
 
-def generate_description_sequential(client, model, max_tokens, sequence_paths, prompt, detail_mode):
-    messages = [
+def build_independent_messages(image_url, prompt, detail_mode):
+    return [
         {
             "role": "user",
             "content": [
                 {"type": "text", "text": prompt},
+                image_content(image_url, detail_mode),
             ],
         },
     ]
 
-    for image_path in sequence_paths:
-        with open(image_path, "rb") as image_file:
-            image_data = image_file.read()
-            image_base64 = base64.b64encode(image_data).decode("utf-8")
 
-        messages[-1]["content"].append({
-            "type": "image_url",
-            "image_url": {
-                "url": f"data:image/jpeg;base64,{image_base64}",
-                "detail": detail_mode.lower()
-            },
-        })
+def build_sequential_messages(image_urls, prompt, detail_mode):
+    content = [{"type": "text", "text": prompt}]
+    content.extend(image_content(image_url, detail_mode) for image_url in image_urls)
+    return [{"role": "user", "content": content}]
+
+
+def build_sequence_messages(sequence_paths, prompt, detail_mode, sequence_request="Multiple Images", upload_stats=None, images=None):
+    # "Multiple Images" sends every frame as its own image, "Mosaic" sends one labelled grid of them,
+    # which needs the manifest entries of the frames (images)
+    if sequence_request == "Mosaic":
+        return build_independent_messages(encode_mosaic(sequence_paths, images, detail_mode), prompt, detail_mode)
+    return build_sequential_messages([encode_image(image_path, detail_mode, upload_stats) for image_path in sequence_paths], prompt, detail_mode)
 
-    response = client.chat.completions.create(
+
+def request_completion(client, model, max_tokens, messages):
+    # Paced by the shared rate limiter, see rate_limiter.py
+    return create_chat_completion(
+        client,
         model=model,
         messages=messages,
         max_tokens=max_tokens,
     )
 
+
+def request_description(client, model, max_tokens, messages):
+    response = request_completion(client, model, max_tokens, messages)
     description = response.choices[0].message.content.strip()
     return description
 
 
+def generate_description_independent(client, model, max_tokens, image_path, prompt, detail_mode, upload_stats=None):
+    messages = build_independent_messages(encode_image(image_path, detail_mode, upload_stats), prompt, detail_mode)
+    return request_description(client, model, max_tokens, messages)
+
+
+def generate_description_sequential(client, model, max_tokens, sequence_paths, prompt, detail_mode, upload_stats=None):
+    messages = build_sequential_messages([encode_image(image_path, detail_mode, upload_stats) for image_path in sequence_paths], prompt, detail_mode)
+    return request_description(client, model, max_tokens, messages)
+
+
 def confirm_sequences(sequences):
     app = QApplication.instance()
     if app is None:
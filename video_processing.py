@@ -1,55 +1,495 @@
 # video_processing.py
-from scenedetect import detect, ContentDetector
+from scenedetect import open_video, ContentDetector, SceneManager, StatsManager
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import inspect
+import threading
+import scenedetect
 import cv2
+import numpy as np
 import os
+import scene_cache
+from keyframe_writer import KeyframeWriter
+from manifest import folder_manifests
+from scene_index import save_scene_index
+from frame_selection import SCORED_STRATEGIES, SceneFrameSelector, SelectingContentDetector, middle_frame
 
-def process_video(video_path, output_folder, sensitivity):
+# How many frames the decode thread of SceneManager may run ahead of the detection callback,
+# on top of the event buffer the detectors themselves ask for.
+TAP_HEADROOM_FRAMES = 8
+
+# Minimum number of frames between two cuts, passed to ContentDetector explicitly so the
+# parallel mode and the sensitivity sweep can apply the same rule to frame scores.
+MIN_SCENE_LEN = 15
+
+
+class FullResolutionTap:
+    # Pass-through wrapper around a scenedetect VideoStream which remembers the most recently
+    # decoded full resolution frames, so keyframes can be taken straight from the detection pass.
+    def __init__(self, video, history):
+        self._video = video
+        self._history = history
+        self._frames = OrderedDict()
+        self._lock = threading.Lock()
+        self.first_frame = None
+
+    def __getattr__(self, name):
+        return getattr(self._video, name)
+
+    def read(self, decode=True):
+        frame = self._video.read(decode)
+        if decode and frame is not False:
+            frame_num = self._video.position.get_frames()
+            with self._lock:
+                if self.first_frame is None:
+                    self.first_frame = (frame_num, frame)
+                self._frames[frame_num] = frame
+                while len(self._frames) > self._history:
+                    self._frames.popitem(last=False)
+        return frame
+
+    def set_history(self, history):
+        with self._lock:
+            self._history = history
+
+    def get_frame(self, frame_num):
+        with self._lock:
+            return self._frames.get(frame_num)
+
+
+def frame_number(position):
+    # scenedetect < 0.7 passes plain ints to callbacks, newer versions pass FrameTimecode objects
+    if isinstance(position, int):
+        return position
+    return position.get_frames()
+
+
+def save_keyframe(output_folder, frame_num, frame, writer=None):
+    # With a KeyframeWriter the JPEG encoding and the write happen on its background threads
+    print(f"Saving keyframe at frame: {frame_num}")
+    keyframe_filename = f"keyframe_{frame_num:06d}.jpg"  # Add leading zeroes
+    keyframe_path = os.path.join(output_folder, keyframe_filename)
+    if writer is not None:
+        writer.submit(keyframe_path, frame)
+    elif not cv2.imwrite(keyframe_path, frame):
+        raise Exception(f"Failed to write keyframe: {keyframe_path}")
+    return keyframe_path
+
+
+def create_scene_manager(sensitivity, downscale=0, collect_metrics=False, detector_class=ContentDetector, **detector_args):
+    # Detection runs on downscaled frames; keyframes are always saved at full resolution.
+    # A downscale of 0 lets scenedetect pick the factor from the video resolution.
+    scene_manager = SceneManager(stats_manager=StatsManager() if collect_metrics else None)
+    detector = detector_class(threshold=sensitivity, min_scene_len=MIN_SCENE_LEN, **detector_args)
+    scene_manager.add_detector(detector)
+    if downscale:
+        scene_manager.auto_downscale = False
+        scene_manager.downscale = downscale
+    return scene_manager, detector
+
+
+def frame_metrics(stats_manager, start_frame, end_frame):
+    # Per-frame ContentDetector scores as a plain list, None where no score exists (first frame)
+    key = ContentDetector.FRAME_SCORE_KEY
+    return [
+        round(float(stats_manager.get_metrics(frame_num, [key])[0]), 4) if stats_manager.metrics_exist(frame_num, [key]) else None
+        for frame_num in range(start_frame, end_frame)
+    ]
+
+
+def detection_params(sensitivity, downscale, frame_skip, frame_selection="first"):
+    return {
+        "detector": "ContentDetector",
+        "scenedetect": scenedetect.__version__,
+        "threshold": sensitivity,
+        "min_scene_len": MIN_SCENE_LEN,
+        "downscale": downscale,
+        "frame_skip": frame_skip,
+        "frame_selection": frame_selection,
+    }
+
+
+def metrics_params(downscale):
+    # Frame scores are the same for every threshold, so they are cached under their own key
+    return detection_params(None, downscale, 0)
+
+
+def get_video_info(video_path):
+    video = cv2.VideoCapture(video_path)
+    if not video.isOpened():
+        raise Exception("Failed to open video file")
+    try:
+        return video.get(cv2.CAP_PROP_FPS), int(video.get(cv2.CAP_PROP_FRAME_COUNT))
+    finally:
+        video.release()
+
+
+def process_video(video_path, output_folder, sensitivity, single_pass=False, downscale=0, frame_skip=0, workers=1, use_cache=False, frame_selection="first", keyframe_callback=None):
+    # keyframe_callback, if given, receives the path of every keyframe as soon as it is on disk
     print(f"Starting video processing for: {video_path}")
     print(f"Output folder: {output_folder}")
     print(f"Sensitivity: {sensitivity}")
-    
+    print(f"Single pass: {single_pass}")
+    print(f"Detection downscale: {downscale or 'auto'}")
+    print(f"Detection frame skip: {frame_skip}")
+    print(f"Workers: {workers}")
+    print(f"Use scene cache: {use_cache}")
+    print(f"Frame selection: {frame_selection}")
+
+    try:
+        # Keyframes are named by frame number, the frame rate turns them into timecodes
+        fps, num_frames = get_video_info(video_path)
+        folder_manifests.set_source(output_folder, video_path, fps)
+        key = None
+        if use_cache:
+            key = scene_cache.cache_key(video_path, detection_params(sensitivity, downscale, frame_skip, frame_selection))
+            entry = scene_cache.load_entry(key)
+            if entry is not None:
+                # Detection is skipped entirely, only the keyframes that are not on disk yet get decoded
+                print(f"Scene cache hit: {len(entry['scenes'])} scenes")
+                extract_keyframes(video_path, output_folder, keyframe_scenes(entry["scenes"], entry.get("keyframes")), skip_existing=True, keyframe_callback=keyframe_callback)
+                save_scene_index(output_folder, video_path, fps, num_frames, entry["scenes"], entry.get("keyframes"))
+                print("Video processing completed.")
+                return output_folder
+            print("Scene cache miss")
+
+        # Per-frame metrics are only worth collecting when they get cached, and StatsManager
+        # does not support frame skipping.
+        collect_metrics = use_cache and frame_skip == 0
+        if frame_selection in SCORED_STRATEGIES:
+            # Picking the sharpest or steadiest frame needs to see every frame of the scene
+            if workers > 1 or not single_pass:
+                print("Frame selection scores every decoded frame, using single pass with one worker")
+            scenes, metrics, keyframes = process_video_single_pass(video_path, output_folder, sensitivity, downscale, frame_skip, collect_metrics, frame_selection, keyframe_callback)
+        elif workers > 1:
+            if single_pass:
+                print("Single pass is not available with several workers, keyframes are extracted per chunk instead")
+            scenes, metrics, keyframes = process_video_parallel(video_path, output_folder, sensitivity, downscale, frame_skip, workers, collect_metrics, keyframe_callback, frame_selection)
+        elif single_pass and frame_selection == "first":
+            scenes, metrics, keyframes = process_video_single_pass(video_path, output_folder, sensitivity, downscale, frame_skip, collect_metrics, keyframe_callback=keyframe_callback)
+        else:
+            if single_pass:
+                print("The middle of a scene is only known once the scene is over, keyframes are extracted after detection instead")
+            scenes, metrics, keyframes = process_video_with_seeks(video_path, output_folder, sensitivity, downscale, frame_skip, collect_metrics, keyframe_callback, frame_selection)
+
+        save_scene_index(output_folder, video_path, fps, num_frames, scenes, keyframes)
+        if use_cache:
+            scene_cache.save_entry(key, scene_cache.make_entry(video_path, fps, num_frames, scenes, metrics, keyframes))
+            if metrics is not None:
+                metrics_key = scene_cache.cache_key(video_path, metrics_params(downscale))
+                scene_cache.save_entry(metrics_key, scene_cache.make_entry(video_path, fps, num_frames, [], metrics))
+            print("Scene list saved to cache")
+        print("Video processing completed.")
+
+    except Exception as e:
+        print(f"Error processing video: {str(e)}")
+        raise
+
+    return output_folder
+
+
+def keyframe_positions(scenes, frame_selection="first"):
+    # Frame of every scene that becomes its keyframe, for the strategies that follow from the
+    # scene list alone. None for "first", whose keyframes are the scene starts.
+    if frame_selection == "middle":
+        return [middle_frame(start_frame, end_frame) for start_frame, end_frame in scenes]
+    return None
+
+
+def keyframe_scenes(scenes, keyframes):
+    # (keyframe, end frame) of every scene for extract_keyframes, which names a keyframe after the
+    # first frame of its pair
+    if keyframes is None:
+        return scenes
+    return [(keyframe, scene[1]) for keyframe, scene in zip(keyframes, scenes)]
+
+
+def process_video_with_seeks(video_path, output_folder, sensitivity, downscale=0, frame_skip=0, collect_metrics=False, keyframe_callback=None, frame_selection="first"):
+    # Detect scenes using ContentDetector with the specified sensitivity, on small frames only
+    print("Detecting scenes...")
+    scene_manager, _ = create_scene_manager(sensitivity, downscale, collect_metrics)
+    video = open_video(video_path)
+    scene_manager.detect_scenes(video=video, frame_skip=frame_skip)
+    scene_list = scene_manager.get_scene_list()
+    num_scenes = len(scene_list)
+    print(f"Number of scenes detected: {num_scenes}")
+
+    scenes = [(scene[0].get_frames(), scene[1].get_frames()) for scene in scene_list]
+    keyframes = keyframe_positions(scenes, frame_selection)
+    extract_keyframes(video_path, output_folder, keyframe_scenes(scenes, keyframes), keyframe_callback=keyframe_callback)
+
+    metrics = None
+    if collect_metrics:
+        metrics = {ContentDetector.FRAME_SCORE_KEY: frame_metrics(scene_manager.stats_manager, 0, video.frame_number)}
+    return scenes, metrics, keyframes
+
+
+def extract_keyframes(video_path, output_folder, scenes, skip_existing=False, keyframe_callback=None):
+    # Returns the paths of the keyframes that are on disk, frames that could not be read have none
+    keyframe_paths = []
+    # Open the video file
+    video = cv2.VideoCapture(video_path)
+    if not video.isOpened():
+        raise Exception("Failed to open video file")
+    print("Video file opened successfully")
+
     try:
-        # Open the video file
-        video = cv2.VideoCapture(video_path)
-        if not video.isOpened():
-            raise Exception("Failed to open video file")
-        print("Video file opened successfully")
-        
         # Get the total number of frames in the video
         num_frames = int(video.get(cv2.CAP_PROP_FRAME_COUNT))
         print(f"Total frames: {num_frames}")
-        
-        # Detect scenes using ContentDetector with the specified sensitivity
-        print("Detecting scenes...")
-        scene_manager = detect(video_path, ContentDetector(threshold=sensitivity))
-        num_scenes = len(scene_manager)
-        print(f"Number of scenes detected: {num_scenes}")
-        
-        # Process each detected scene
-        for i, scene in enumerate(scene_manager):
-            start_frame = scene[0].get_frames()
-            end_frame = scene[1].get_frames()
-            print(f"Processing scene {i+1}: start_frame={start_frame}, end_frame={end_frame}")
-            
-            # Set the video position to the start frame of the scene
-            video.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
-            success, frame = video.read()
-            if not success:
-                print(f"Failed to read frame at position: {start_frame}")
-                continue
-            
-            # Save the keyframe for the scene
-            print(f"Saving keyframe at frame: {start_frame}")
-            keyframe_filename = f"keyframe_{start_frame:06d}.jpg"  # Add leading zeroes
-            keyframe_path = os.path.join(output_folder, keyframe_filename)
-            cv2.imwrite(keyframe_path, frame)
-        
+
+        # Writes run in the background while the next keyframe is decoded, the writer is flushed
+        # (and raises on failed writes) when the block exits.
+        with KeyframeWriter(on_written=keyframe_callback) as writer:
+            # Process each detected scene, only its keyframe is decoded at full resolution
+            for i, (start_frame, end_frame) in enumerate(scenes):
+                print(f"Processing scene {i+1}: start_frame={start_frame}, end_frame={end_frame}")
+                keyframe_path = os.path.join(output_folder, f"keyframe_{start_frame:06d}.jpg")
+                if skip_existing and os.path.exists(keyframe_path):
+                    print(f"Keyframe at frame {start_frame} already exists")
+                    writer.submit_existing(keyframe_path)
+                    keyframe_paths.append(keyframe_path)
+                    continue
+
+                # Set the video position to the start frame of the scene
+                video.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+                success, frame = video.read()
+                if not success:
+                    print(f"Failed to read frame at position: {start_frame}")
+                    continue
+
+                # Save the keyframe for the scene
+                keyframe_paths.append(save_keyframe(output_folder, start_frame, frame, writer))
+    finally:
         # Release the video capture
         video.release()
-        print("Video processing completed.")
-        
-    except Exception as e:
-        print(f"Error processing video: {str(e)}")
-        raise
-    
-    return output_folder
\ No newline at end of file
+    return keyframe_paths
+
+
+def split_into_chunks(num_frames, workers, frame_skip=0):
+    # Chunk boundaries are aligned to the frame skip stride, so every chunk decodes exactly the
+    # frames a serial run would look at. Very short videos get fewer chunks.
+    stride = frame_skip + 1
+    num_chunks = max(1, min(workers, num_frames // (4 * (MIN_SCENE_LEN + 1) * stride)))
+    boundaries = [(num_frames * i // num_chunks) // stride * stride for i in range(num_chunks)]
+    return list(zip(boundaries, boundaries[1:] + [num_frames]))
+
+
+class ScoreRecordingDetector(ContentDetector):
+    # ContentDetector which keeps the score of every frame it processes, None for the first one (it
+    # has nothing to be compared with). Unlike a StatsManager this also works with frame skipping.
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.scores = {}
+
+    def process_frame(self, timecode, frame_img):
+        cuts = super().process_frame(timecode, frame_img)
+        self.scores[frame_number(timecode)] = getattr(self, "_frame_score", None) if self.scores else None
+        return cuts
+
+
+def detect_chunk(video_path, sensitivity, downscale, frame_skip, start_frame, end_frame):
+    # Runs in a worker process and only scores the frames of [start_frame, end_frame), one score
+    # per frame, None for frames that were skipped. Decoding starts a little before the chunk so the
+    # first frame of the chunk has its predecessor to be compared with. Cuts are decided afterwards
+    # over the scores of the whole video, the flash filter needs to see past chunk boundaries.
+    stride = frame_skip + 1
+    lead_in = min(start_frame, (MIN_SCENE_LEN + 1) * stride)
+    video = open_video(video_path)
+    if start_frame - lead_in > 0:
+        video.seek(start_frame - lead_in)
+    scene_manager, detector = create_scene_manager(sensitivity, downscale, detector_class=ScoreRecordingDetector)
+    scene_manager.detect_scenes(video=video, end_time=end_frame, frame_skip=frame_skip)
+    return [detector.scores.get(frame_num) for frame_num in range(start_frame, end_frame)]
+
+
+def flash_filter_merges():
+    # Newer scenedetect versions merge cuts closer than min_scene_len instead of suppressing them
+    return "filter_mode" in inspect.signature(ContentDetector.__init__).parameters
+
+
+def threshold_cuts(frames_above, processed, min_scene_len, merge):
+    # Cuts of one threshold. The scan only stops at events (a cut, the start or the end of a
+    # merge), everything between them is found with array operations over the frames above the
+    # threshold: runs of frames that follow the previous one by at least min_scene_len are all
+    # cuts, and the end of a merge is looked up with searchsorted.
+    if min_scene_len <= 0:
+        # The flash filter is off, every frame above the threshold is a cut
+        return frames_above.tolist()
+    if not merge:
+        # Suppress: the next cut is the first frame above the threshold min_scene_len past the last
+        cuts = []
+        last_cut = 0
+        while True:
+            position = np.searchsorted(frames_above, last_cut + min_scene_len)
+            if position == len(frames_above):
+                return cuts
+            last_cut = int(frames_above[position])
+            cuts.append(last_cut)
+
+    # The detector starts with frame 0 as its last frame above the threshold
+    long_gap = np.diff(frames_above, prepend=0) >= min_scene_len
+    short_gaps = np.flatnonzero(~long_gap)
+    # A merge can end after a frame above the threshold when a processed frame below it comes
+    # min_scene_len later, before the next frame above it
+    next_processed = np.append(processed, np.iinfo(np.int64).max)[np.searchsorted(processed, frames_above + min_scene_len)]
+    next_above = np.append(frames_above[1:], np.iinfo(np.int64).max)
+    merge_ends = np.flatnonzero(next_processed < next_above)
+
+    cuts = []
+    merge_enabled = False
+    position = 0
+    while position < len(frames_above):
+        # Idle: every frame up to the next short gap is a cut
+        next_short = np.searchsorted(short_gaps, position)
+        merge_at = int(short_gaps[next_short]) if next_short < len(short_gaps) else len(frames_above)
+        if merge_at > position:
+            cuts.extend(frames_above[position:merge_at].tolist())
+            merge_enabled = True
+        if merge_at == len(frames_above):
+            break
+        if not merge_enabled:
+            # Cuts are only merged once the first one was made
+            position = merge_at + 1
+            continue
+        # Merging from merge_at: it ends with the first frame above the threshold that is
+        # min_scene_len past the start of the merge and can end it, that frame is the cut
+        earliest = max(merge_at, int(np.searchsorted(frames_above, frames_above[merge_at] + min_scene_len)))
+        next_end = np.searchsorted(merge_ends, earliest)
+        if next_end == len(merge_ends):
+            break
+        end = int(merge_ends[next_end])
+        cuts.append(int(frames_above[end]))
+        # The frame after it comes more than min_scene_len later, back to idle
+        position = end + 1
+    return cuts
+
+
+def cuts_for_thresholds(scores, thresholds, min_scene_len=MIN_SCENE_LEN, merge=None):
+    # Reproduces ContentDetector's cut decisions for many thresholds at once, from the per-frame
+    # scores of a detection run (sensitivity sweep) or of the chunks of a parallel run. A missing
+    # score (None or NaN) is a frame the detector skipped.
+    if merge is None:
+        merge = flash_filter_merges()
+    scores = np.asarray(scores, dtype=float)
+    # The first frame has no score, ContentDetector treats it as 0
+    if len(scores):
+        scores[0] = np.nan_to_num(scores[0], nan=0.0)
+    processed = np.flatnonzero(~np.isnan(scores))
+    with np.errstate(invalid="ignore"):
+        return {
+            float(threshold): threshold_cuts(np.flatnonzero(scores >= threshold), processed, min_scene_len, merge)
+            for threshold in thresholds
+        }
+
+
+def scenes_from_cuts(cuts, num_frames):
+    # Same convention as SceneManager.get_scene_list(): no cuts means no scenes
+    if not cuts:
+        return []
+    starts = [0] + list(cuts)
+    return list(zip(starts, starts[1:] + [num_frames]))
+
+
+def process_video_parallel(video_path, output_folder, sensitivity, downscale=0, frame_skip=0, workers=2, collect_metrics=False, keyframe_callback=None, frame_selection="first"):
+    _, num_frames = get_video_info(video_path)
+    print(f"Total frames: {num_frames}")
+    chunks = split_into_chunks(num_frames, workers, frame_skip)
+    print(f"Detecting scenes in {len(chunks)} chunks with {workers} workers...")
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(detect_chunk, video_path, sensitivity, downscale, frame_skip, start, end)
+            for start, end in chunks
+        ]
+        scores = [score for future in futures for score in future.result()]
+        # The cuts a serial run makes, flash filter included, decided over the stitched scores
+        cuts = cuts_for_thresholds(scores, [sensitivity])[float(sensitivity)]
+        metrics = None
+        if collect_metrics:
+            metrics = {ContentDetector.FRAME_SCORE_KEY: [None if score is None else round(float(score), 4) for score in scores]}
+
+        scenes = scenes_from_cuts(cuts, num_frames)
+        if not scenes:
+            print("Number of scenes detected: 0")
+            return [], metrics, None
+        print(f"Number of scenes detected: {len(scenes)}")
+
+        # Keyframe extraction is split by the same chunks, each worker seeks within its own range
+        keyframes = keyframe_positions(scenes, frame_selection)
+        chunk_scenes = [[scene for scene in keyframe_scenes(scenes, keyframes) if start <= scene[0] < end] for start, end in chunks]
+        futures = [executor.submit(extract_keyframes, video_path, output_folder, scenes_in_chunk) for scenes_in_chunk in chunk_scenes]
+        for future in futures:
+            keyframe_paths = future.result()
+            # Callbacks cannot cross the process boundary, report a chunk's keyframes once it is done
+            if keyframe_callback:
+                for keyframe_path in keyframe_paths:
+                    keyframe_callback(keyframe_path)
+
+    return scenes, metrics, keyframes
+
+
+def process_video_single_pass(video_path, output_folder, sensitivity, downscale=0, frame_skip=0, collect_metrics=False, frame_selection="first", keyframe_callback=None):
+    # Keyframes are written from the detect_scenes() callback while the video is decoded,
+    # so the file is decoded exactly once and no seeking is needed afterwards.
+    # With a frame selection strategy other than "first", a SceneFrameSelector scores the frames of
+    # each scene as they pass and writes the chosen one once the scene is over.
+    video = open_video(video_path)
+    print("Video file opened successfully")
+    print(f"Total frames: {video.duration.get_frames() if video.duration is not None else 'unknown'}")
+
+    keyframes = []
+    writer = KeyframeWriter(on_written=keyframe_callback)
+    tap = FullResolutionTap(video, TAP_HEADROOM_FRAMES)
+    selector = None
+    if frame_selection == "first":
+        scene_manager, detector = create_scene_manager(sensitivity, downscale, collect_metrics)
+    else:
+        def on_frame_selected(frame_num, frame):
+            keyframes.append(frame_num)
+            save_keyframe(output_folder, frame_num, frame, writer)
+
+        selector = SceneFrameSelector(frame_selection, MIN_SCENE_LEN * (frame_skip + 1), on_frame_selected)
+        scene_manager, detector = create_scene_manager(sensitivity, downscale, collect_metrics, SelectingContentDetector, selector=selector, tap=tap)
+    tap.set_history(TAP_HEADROOM_FRAMES + getattr(detector, "event_buffer_length", 0))
+
+    def on_new_scene(frame_img, position):
+        if selector is not None:
+            return
+        frame_num = frame_number(position)
+        frame = tap.get_frame(frame_num)
+        if frame is None:
+            # Should not happen with a large enough tap, but the (possibly downscaled) detection
+            # frame is still better than losing the scene.
+            print(f"Full resolution frame {frame_num} no longer buffered, saving detection frame")
+            frame = frame_img
+        if not keyframes and tap.first_frame is not None:
+            # The callback only fires on cuts, the first scene starts at the first decoded frame.
+            # It is saved before the cut so keyframes are written in frame order.
+            save_first_keyframe()
+        keyframes.append(frame_num)
+        save_keyframe(output_folder, frame_num, frame, writer)
+
+    def save_first_keyframe():
+        first_frame_num, first_frame = tap.first_frame
+        keyframes.append(first_frame_num)
+        save_keyframe(output_folder, first_frame_num, first_frame, writer)
+
+    with writer:
+        print("Detecting scenes and capturing keyframes...")
+        scene_manager.detect_scenes(video=tap, frame_skip=frame_skip, callback=on_new_scene)
+        scene_list = scene_manager.get_scene_list()
+        print(f"Number of scenes detected: {len(scene_list)}")
+
+        if selector is not None:
+            selector.finish()
+        # A video without cuts can still be one scene
+        elif not keyframes and scene_list and tap.first_frame is not None:
+            if scene_list[0][0].get_frames() == tap.first_frame[0]:
+                save_first_keyframe()
+
+    scenes = [(scene[0].get_frames(), scene[1].get_frames()) for scene in scene_list]
+    metrics = None
+    if collect_metrics:
+        metrics = {ContentDetector.FRAME_SCORE_KEY: frame_metrics(scene_manager.stats_manager, 0, video.frame_number)}
+    return scenes, metrics, keyframes